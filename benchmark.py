@@ -0,0 +1,472 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import run
+
+CATEGORIES = (
+    "Programming", "Databases", "Networking", "Security", "Mathematics",
+    "Statistics", "Biology", "Chemistry", "Physics", "History",
+    "Geography", "Literature", "Music", "Art", "Economics",
+    "Philosophy", "Languages", "Law", "Medicine", "Astronomy",
+)
+WORDS = (
+    "binary", "cache", "index", "vector", "queue", "graph", "kernel",
+    "protocol", "theorem", "enzyme", "isotope", "velocity", "empire",
+    "delta", "sonnet", "chord", "fresco", "market", "ethics", "grammar",
+    "statute", "neuron", "orbit", "matrix", "lambda", "signal", "cipher",
+)
+SIZES = (1000, 100000, 1000000)
+QUIZ_QUESTIONS = 20  # Questions drawn when timing question selection
+PROGRESS_SAVES = 10  # Quizzes saved when timing save_progress
+STRESS_DELETE_EVERY = 5  # Each stress writer deletes every fifth card
+RECENT_DAYS = 7  # Days of history read when timing a recent progress view
+
+# --- Data Generation Functions ---
+
+
+def generate_card(rng, number):
+    """
+    Returns one synthetic flashcard in its JSON form.
+    """
+    return {
+        "term": f"{rng.choice(WORDS).title()} {number}",
+        "definition": " ".join(rng.choices(WORDS, k=rng.randint(4, 12))),
+        "category": rng.choice(CATEGORIES),
+        "id": number,
+    }
+
+
+def generate_progress_entry(rng, date):
+    """
+    Returns one synthetic progress entry for a quiz taken at date.
+    """
+    total_questions = rng.randint(1, 20)
+    score = rng.randint(0, total_questions)
+    return {
+        "date": date.strftime("%Y-%m-%d %H:%M:%S"),
+        "category": rng.choice(CATEGORIES + ("All Categories",)),
+        "score": score,
+        "total_questions": total_questions,
+        "success_rate": round(score / total_questions * 100, 2),
+    }
+
+
+def write_deck(filename, size, rng):
+    """
+    Writes a deck of size synthetic flashcards in the flashcards.json
+    format.
+    """
+    with open(filename, "w") as file:
+        json.dump(
+            [generate_card(rng, number) for number in range(1, size + 1)],
+            file,
+            indent=4,
+        )
+
+
+def write_progress(filename, size, rng):
+    """
+    Writes a progress history of size synthetic quizzes, an hour apart,
+    in the progress.jsonl format.
+    """
+    date = datetime(2020, 1, 1)
+    with open(filename, "w") as file:
+        for _ in range(size):
+            file.write(json.dumps(generate_progress_entry(rng, date)) + "\n")
+            date += timedelta(hours=1)
+
+
+# --- Timing Functions ---
+
+
+def best_time(action, setup=None, repeat=3):
+    """
+    Returns the shortest of repeat timings of action, in seconds. Setup,
+    if given, runs untimed before each timing.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        run.screen_buffer().clear()  # Drop the messages printed
+    return best
+
+
+def reset_deck():
+    """
+    Forgets the loaded deck, so the next load starts from the files.
+    """
+    run.flashcards = []
+    run.category_index.clear()
+    run.search_index = run.term_index = None
+    run.review_schedule = None
+    run.progress_index = None
+    if run.card_stats is not None:
+        run.card_stats.close()
+        run.card_stats = None
+    if run.database is not None:
+        run.database.close()
+        run.database = None
+
+
+def deck_memory():
+    """
+    Returns the bytes allocated by loading the deck and still held once it
+    is loaded, traced with tracemalloc.
+    """
+    reset_deck()
+    tracemalloc.start()
+    try:
+        run.load_flashcards()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+        run.screen_buffer().clear()
+
+
+def select_questions(count):
+    """
+    Builds a quiz over the whole deck and picks count questions the way
+    start_quiz and run_quiz_questions do, without asking them.
+    """
+    cards = run.all_flashcards()
+    sampler = run.quiz_sampler(cards)
+    for _ in range(min(count, len(cards))):
+        position = sampler.sample()
+        sampler.update(position, 0.0)
+        cards[position]
+
+
+def save_quizzes(count):
+    """
+    Saves count quiz results with save_progress.
+    """
+    for _ in range(count):
+        run.save_progress(CATEGORIES[0], 7, 10)
+
+
+def view_progress_summary():
+    """
+    Runs view_progress, stopping the history after its first page and
+    declining to clear it, so what is timed is reading the first page and
+    the summary.
+    """
+    run.terminal.input = io.StringIO("q\nno\n")
+    run.terminal.output = io.StringIO()
+    try:
+        run.view_progress()
+    finally:
+        run.terminal.input = run.terminal.output = None
+
+
+def benchmark(size, storage, seed, repeat):
+    """
+    Generates a deck and progress history of the given size in a fresh
+    directory and returns the timings of each operation, in seconds, and
+    the memory the loaded deck takes per card, in bytes.
+    """
+    rng = random.Random(seed)
+    timings = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            write_deck("flashcards.json", size, rng)
+            write_progress(run.progress_file, size, rng)
+            run.storage_mode = storage
+            reset_deck()
+            run.load_flashcards()  # Untimed first load migrates the files
+            run.initialize_progress_file()
+            bytes_per_card = deck_memory() / size
+
+            timings["load_flashcards"] = best_time(
+                run.load_flashcards, setup=reset_deck, repeat=repeat
+            )
+            run.initialize_progress_file()
+            timings["save_flashcards"] = best_time(
+                run.save_flashcards, repeat=repeat
+            )
+            timings["list_categories"] = best_time(
+                run.get_categories, repeat=repeat
+            )
+            timings["filter_category"] = best_time(
+                lambda: list(run.get_category_flashcards(CATEGORIES[0])),
+                repeat=repeat,
+            )
+            timings["select_questions"] = best_time(
+                lambda: select_questions(QUIZ_QUESTIONS),
+                repeat=repeat,
+            )
+            timings["rebuild_progress_summary"] = best_time(
+                run.rebuild_progress_summary, repeat=repeat
+            )
+            timings["save_progress"] = best_time(
+                lambda: save_quizzes(PROGRESS_SAVES), repeat=repeat
+            ) / PROGRESS_SAVES
+            timings["view_progress"] = best_time(
+                view_progress_summary, repeat=repeat
+            )
+            end = datetime(2020, 1, 1) + timedelta(hours=size)
+            timings["recent_progress"] = best_time(
+                lambda: list(
+                    run.read_progress_range(
+                        end - timedelta(days=RECENT_DAYS), end
+                    )
+                ),
+                repeat=repeat,
+            )
+            timings["progress_analytics"] = best_time(
+                run.progress_analytics, repeat=repeat
+            )
+        finally:
+            reset_deck()
+            os.chdir(cwd)
+    return timings, bytes_per_card
+
+
+# --- Stress Test Functions ---
+
+
+def stress_writer(directory, storage, changes, number):
+    """
+    One concurrent session: adds changes cards, deleting every
+    STRESS_DELETE_EVERY-th one again, and saves a quiz after each card.
+    """
+    os.chdir(directory)
+    run.storage_mode = storage
+    reset_deck()
+    run.load_flashcards()
+    run.initialize_progress_file()
+    for change in range(changes):
+        flashcard = run.Flashcard(f"P{number} C{change}", "Stress", "Stress")
+        run.insert_flashcard(flashcard)
+        if change % STRESS_DELETE_EVERY == STRESS_DELETE_EVERY - 1:
+            run.remove_flashcard(flashcard.card_id)
+        run.save_progress("Stress", 1, 1)
+        run.screen_buffer().clear()
+    run.flush_saves()  # Processes started by fork skip atexit handlers
+
+
+def stress_reader(directory, storage, stop, errors):
+    """
+    Loads the deck and reads the progress history over and over while the
+    writers run, counting loads that found a damaged file.
+    """
+    os.chdir(directory)
+    run.storage_mode = storage
+    while not stop.is_set():
+        reset_deck()
+        run.load_flashcards()
+        sum(1 for _ in run.read_progress())
+        if any("Corrupted" in text for text in run.screen_buffer()):
+            errors.value += 1
+        run.screen_buffer().clear()
+
+
+def check_indexes(storage):
+    """
+    Adds a card, searches, then deletes the card again, with the term
+    index built first and, in lazy mode, a search index saved by an
+    earlier session. Returns whether both indexes forgot the card.
+    """
+    reset_deck()
+    run.storage_mode = storage
+    run.load_flashcards()
+    run.search_flashcards("Stress")  # Builds the search index
+    if storage == "lazy":
+        run.save_lazy_index()  # Saved for the next session to read
+    reset_deck()
+    run.load_flashcards()
+    run.has_term("Zed")  # Builds the term index
+    flashcard = run.Flashcard("Zed", "Check", "Check")
+    run.insert_flashcard(flashcard)
+    found = list(run.search_flashcards("Zed"))
+    run.remove_flashcard(flashcard.card_id)
+    run.screen_buffer().clear()
+    return (
+        found == [flashcard.card_id]
+        and not run.has_term("Zed")
+        and not run.search_flashcards("Zed")
+    )
+
+
+def stress(storage, processes, changes):
+    """
+    Runs processes writers and one reader against the same files and
+    checks that no card or progress entry was lost. Returns the findings.
+    """
+    context = multiprocessing.get_context("fork")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            with open("flashcards.json", "w") as file:
+                json.dump([], file)
+            open(run.progress_file, "w").close()
+            stop = context.Event()
+            errors = context.Value("i", 0)
+            reader = context.Process(
+                target=stress_reader,
+                args=(directory, storage, stop, errors),
+            )
+            writers = [
+                context.Process(
+                    target=stress_writer,
+                    args=(directory, storage, changes, number),
+                )
+                for number in range(processes)
+            ]
+            start = time.perf_counter()
+            reader.start()
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            reader.join()
+
+            run.storage_mode = storage
+            reset_deck()
+            run.load_flashcards()
+            expected = {
+                f"P{number} C{change}"
+                for number in range(processes)
+                for change in range(changes)
+                if change % STRESS_DELETE_EVERY != STRESS_DELETE_EVERY - 1
+            }
+            terms = [flashcard["term"] for flashcard in run.flashcards]
+            summary = run.load_progress_summary()["overall"]
+            findings = {
+                "storage": storage,
+                "processes": processes,
+                "changes": changes,
+                "seconds": elapsed,
+                "expected_cards": len(expected),
+                "cards": len(terms),
+                "expected_progress": processes * changes,
+                "progress": sum(1 for _ in run.read_progress()),
+                "summary_quizzes": summary["num_quizzes"],
+                "damaged_reads": errors.value,
+                "indexes_ok": check_indexes(storage),
+            }
+            findings["ok"] = (
+                sorted(terms) == sorted(expected)
+                and findings["progress"] == findings["expected_progress"]
+                and findings["summary_quizzes"] == findings["progress"]
+                and not errors.value
+                and findings["indexes_ok"]
+            )
+        finally:
+            reset_deck()
+            run.screen_buffer().clear()
+            os.chdir(cwd)
+    return findings
+
+
+def code_version():
+    """
+    Returns the git commit being benchmarked, or None outside a checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Runs the benchmarks from the command line and prints the results as
+    JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Time the Quiz Cards hot paths on generated decks and "
+        "progress histories, printing the results as JSON."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=SIZES,
+        help="numbers of cards and progress entries to generate",
+    )
+    parser.add_argument(
+        "--storage",
+        nargs="+",
+        choices=("json", "journal", "sqlite", "lazy"),
+        default=[run.storage_mode],
+        help="storage modes to benchmark",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="timings per operation"
+    )
+    parser.add_argument("--output", help="file to write the JSON to")
+    parser.add_argument(
+        "--stress",
+        type=int,
+        metavar="PROCESSES",
+        help="instead of timing, run this many concurrent writers and "
+        "check no change is lost",
+    )
+    parser.add_argument(
+        "--changes", type=int, default=50, help="cards added per writer"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "version": code_version(),
+        "python": platform.python_version(),
+    }
+    if args.stress:
+        results["stress"] = [
+            stress(storage, args.stress, args.changes)
+            for storage in args.storage
+        ]
+    else:
+        results["seed"] = args.seed
+        results["repeat"] = args.repeat
+        results["results"] = []
+        for size in args.sizes:
+            for storage in args.storage:
+                timings, bytes_per_card = benchmark(
+                    size, storage, args.seed, args.repeat
+                )
+                results["results"].append(
+                    {
+                        "size": size,
+                        "storage": storage,
+                        "seconds": timings,
+                        "bytes_per_card": round(bytes_per_card),
+                    }
+                )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,69 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const net = require('net');
+const { spawn } = require('child_process');
+
+// When set, sessions are served by the pre-forked Python session pool
+// listening on this Unix socket instead of a fresh python3 per connection.
+const SESSION_SOCKET = process.env.QUIZ_CARDS_SESSION_SOCKET;
 
 exports.install = function () {
 
     ROUTE('/');
     WEBSOCKET('/', socket, ['raw']);
 
+    if (SESSION_SOCKET) {
+        startSessionPool();
+    }
+
 };
 
+function startSessionPool() {
+
+    const pool = spawn('python3', ['session_server.py', '--socket', SESSION_SOCKET], {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
+
+    pool.on('exit', function (code, signal) {
+        console.log("Session pool stopped, restarting");
+        setTimeout(startSessionPool, 1000);
+    });
+}
+
+// Gives a pool connection the parts of the node-pty interface used below
+function connectSession() {
+
+    const connection = net.createConnection(SESSION_SOCKET);
+
+    // Deliver strings, as node-pty does
+    connection.setEncoding('utf8');
+
+    // The pool may not be listening yet, or be restarting. Without a
+    // listener the error would stop the web server; 'close' follows it
+    // and closes the client.
+    connection.on('error', function (err) {
+        console.log("Session pool connection failed: " + err.message);
+    });
+
+    return {
+        on: function (event, callback) {
+            if (event === 'exit') {
+                connection.on('close', function () { callback(0); });
+            } else {
+                connection.on(event, callback);
+            }
+        },
+        write: function (data) {
+            connection.write(data);
+        },
+        kill: function () {
+            connection.destroy();
+        }
+    };
+}
+
 function socket() {
 
     this.encodedecode = false;
@@ -16,13 +72,17 @@ function socket() {
     this.on('open', function (client) {
 
         // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
-            name: 'xterm-color',
-            cols: 80,
-            rows: 24,
-            cwd: process.env.PWD,
-            env: process.env
-        });
+        if (SESSION_SOCKET) {
+            client.tty = connectSession();
+        } else {
+            client.tty = Pty.spawn('python3', ['run.py'], {
+                name: 'xterm-color',
+                cols: 80,
+                rows: 24,
+                cwd: process.env.PWD,
+                env: process.env
+            });
+        }
 
         client.tty.on('exit', function (code, signal) {
             client.tty = null;
@@ -57,4 +117,4 @@ if (process.env.CREDS != null) {
             socket.emit("console_output", "Error saving credentials: " + err);
         }
     });
-}
\ No newline at end of file
+}
@@ -1,95 +1,2435 @@
+import argparse
+import atexit
+import bisect
+import collections
+import contextlib
+import csv
+import fcntl
+import functools
+import gc
+import hashlib
+import heapq
+import itertools
 import json
+import marshal
+import mmap
+import operator
 import os
 import random
-from datetime import datetime
+import re
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:  # Optional: progress analytics fall back to plain Python without it
+    import numpy
+except ImportError:
+    numpy = None
 
 flashcards = []
-progress_file = "progress.json"  # JSON file for storing user progress
+# Per-session screen buffer and, when sessions share one process, the
+# session's input and output streams (see session_server.py)
+terminal = threading.local()
+storage_lock = threading.RLock()  # Serialises changes to shared storage
+held_locks = {}  # Lock file -> [open file, times taken] (see file_lock)
+deck_version = None  # Saved version of the deck held in memory
+journal_offset = 0  # Bytes of the journal applied to the deck in memory
+PAGE_SIZE = 10  # Quiz Cards or progress entries shown per page
+category_index = {}  # Category name -> ascending positions in flashcards
+search_index = None  # Word -> ascending ids of the cards using it
+term_index = None  # Hash of a normalised term -> cards with that term
+# Directory holding this deck's files, "" for the working directory.
+# session_server.py sets it before running its own copy of this module
+# for each user (see user_directory).
+data_directory = globals().get("data_directory", "")
+deck_file = os.path.join(data_directory, "flashcards.json")
+# One JSON quiz result per line
+progress_file = os.path.join(data_directory, "progress.jsonl")
+# List-based format, migrated once
+legacy_progress_file = os.path.join(data_directory, "progress.json")
+# Running aggregates
+progress_summary_file = os.path.join(data_directory, "progress_summary.json")
+# Quiz dates and line offsets, sorted for range queries
+progress_index_file = os.path.join(data_directory, "progress.jsonl.idx")
+progress_index = None  # ProgressIndex, loaded on the first range query
+PROGRESS_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# With QUIZ_CARDS_USERS_DIR set, each user has their own deck and progress
+# in a directory under it. QUIZ_CARDS_USER names the user, or they are asked.
+users_directory = os.environ.get("QUIZ_CARDS_USERS_DIR")
+USER_NAME_MAX = 100  # Longer encoded names are cut and given their hash
+
+# "json" rewrites flashcards.json on every change, "journal" appends each
+# change to a small log that is folded back into flashcards.json later,
+# "sqlite" keeps cards and progress in database_file with one row per change
+# and "lazy" memory-maps flashcards.jsonl and decodes cards on demand.
+storage_mode = os.environ.get("QUIZ_CARDS_STORAGE", "json")
+JOURNAL_COMPACT_BYTES = 256 * 1024  # Compact once the journal passes this
+LAZY_COMPACT_RECORDS = 1000  # Superseded lines a lazy deck may carry
+IMPORT_BATCH_SIZE = 1000  # Imported cards validated and added at a time
+# Identifies the snapshot cache layout and the marshal format it was
+# written with; a cache written by anything else is ignored
+SNAPSHOT_CACHE_FORMAT = [1, marshal.version, *sys.version_info[:2]]
+database_file = os.path.join(data_directory, "quiz_cards.db")
+database = None  # sqlite3 connection, opened on first use
+next_card_id = 1  # Id given to the next new flashcard
+
+# Opt-in background saving for json mode: changes made less than
+# save_delay seconds apart are written together by a background thread
+# instead of after each one. Unset or 0 saves every change at once.
+save_delay = float(os.environ.get("QUIZ_CARDS_SAVE_DELAY", "0"))
+SAVE_MAX_DELAYS = 5  # A burst of changes is written within this many delays
+saver = None  # BackgroundSaver, started by the first deferred save
+
+# Opt-in instrumentation: a Prometheus text file (the name may include
+# {pid}) and/or a local HTTP endpoint. Both unset means no overhead.
+metrics_file = os.environ.get("QUIZ_CARDS_METRICS_FILE")
+metrics_port = os.environ.get("QUIZ_CARDS_METRICS_PORT")
+METRIC_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0)  # Seconds
+METRICS_EXPORT_SECONDS = 1.0  # Least time between metrics file writes
+
+# One line per review
+review_schedule_file = os.path.join(data_directory, "review_schedule.jsonl")
+review_schedule = None  # ReviewSchedule, loaded on the first review
+REVIEW_RETRY_SECONDS = 10 * 60  # A missed card comes back after this
+REVIEW_COMPACT_RECORDS = 1000  # Superseded lines the schedule may carry
+
+# Fixed-width answer counts per card, indexed by card id
+card_stats_file = os.path.join(data_directory, "card_stats.bin")
+card_stats = None  # CardStatistics, opened on the first answer
+CARD_STATS_FIELDS = 3  # Attempts, correct answers, last seen (Unix time)
+CARD_STATS_RECORD_SIZE = CARD_STATS_FIELDS * array("I").itemsize
+CARD_STATS_MIN_RECORDS = 1024  # Records the file is first created with
+
+ANALYTICS_WINDOW = 20  # Quizzes in each rolling average
+ANALYTICS_PERCENTILES = (25, 50, 75, 90)  # Of per-quiz success rates
+ANALYTICS_MISSED_CARDS = 10  # Cards listed as the most often missed
+
+# --- Flashcard Data Model ---
+
+
+class Flashcard:
+    """
+    A single Quiz Card. Uses __slots__ instead of a per-card dict and
+    interns the category, so cards in the same category share one string.
+    Supports the flashcard["term"] style access used throughout the program.
+    """
+
+    __slots__ = ("term", "definition", "category", "card_id")
+    fields = ("term", "definition", "category")
+
+    def __init__(
+        self, term, definition, category="Uncategorized", card_id=None
+    ):
+        self.term = term
+        self.definition = definition
+        self.category = sys.intern(category) if category else category
+        self.card_id = card_id  # Saved with the card, rising through the deck
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        if key == "category" and value:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __repr__(self):
+        return (
+            f"Flashcard({self.term!r}, {self.definition!r}, "
+            f"{self.category!r})"
+        )
+
+    def update(self, fields):
+        """
+        Updates several fields at once, like dict.update.
+        """
+        for key, value in fields.items():
+            self[key] = value
+
+    def to_dict(self):
+        """
+        Returns the flashcard in its JSON form.
+        """
+        data = {
+            "term": self.term,
+            "definition": self.definition,
+            "category": self.category,
+        }
+        if self.card_id is not None:
+            data["id"] = self.card_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a flashcard from its JSON form.
+        """
+        return cls(
+            data["term"],
+            data["definition"],
+            data.get("category"),
+            data.get("id"),
+        )
+
+
+# --- Instrumentation Functions ---
+
+
+class Metrics:
+    """
+    Durations, bytes read and written and the deck size recorded by the
+    instrumented operations, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Sessions may share one process
+        self.durations = {}  # Operation -> [count, sum, bucket counts]
+        self.bytes = {}  # (operation, direction) -> bytes
+        self.deck_size = 0
+        self.exported = 0.0  # When the metrics file was last written
+
+    def observe(self, operation, seconds, deck_size):
+        """
+        Records one call of an operation.
+        """
+        with self.lock:
+            counts = self.durations.setdefault(
+                operation, [0, 0.0] + [0] * len(METRIC_BUCKETS)
+            )
+            counts[0] += 1
+            counts[1] += seconds
+            for i, bound in enumerate(METRIC_BUCKETS, start=2):
+                if seconds <= bound:
+                    counts[i] += 1
+            self.deck_size = deck_size
+
+    def add_bytes(self, operation, direction, amount):
+        """
+        Adds to the bytes an operation has read or written.
+        """
+        with self.lock:
+            key = (operation, direction)
+            self.bytes[key] = self.bytes.get(key, 0) + amount
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+        lines = [
+            "# TYPE quiz_cards_operation_seconds histogram",
+        ]
+        with self.lock:
+            for operation, counts in sorted(self.durations.items()):
+                label = f'operation="{operation}"'
+                for bound, count in zip(METRIC_BUCKETS, counts[2:]):
+                    lines.append(
+                        f"quiz_cards_operation_seconds_bucket"
+                        f'{{{label},le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f"quiz_cards_operation_seconds_bucket"
+                    f'{{{label},le="+Inf"}} {counts[0]}'
+                )
+                lines.append(
+                    f"quiz_cards_operation_seconds_sum{{{label}}} {counts[1]}"
+                )
+                lines.append(
+                    f"quiz_cards_operation_seconds_count{{{label}}} "
+                    f"{counts[0]}"
+                )
+            lines.append("# TYPE quiz_cards_operation_bytes_total counter")
+            for (operation, direction), amount in sorted(self.bytes.items()):
+                lines.append(
+                    f"quiz_cards_operation_bytes_total{{operation="
+                    f'"{operation}",direction="{direction}"}} {amount}'
+                )
+            lines.append("# TYPE quiz_cards_deck_size gauge")
+            lines.append(f"quiz_cards_deck_size {self.deck_size}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics() if metrics_file or metrics_port else None
+current_operation = threading.local()  # Innermost instrumented operation
+
+
+def instrumented(operation):
+    """
+    Decorates a function so the time each call takes, and the deck size
+    afterwards, are recorded under the operation's name. Time spent
+    waiting at read_input prompts is left out, so menu actions record
+    the work done rather than how long the user took to type. With
+    metrics disabled the function is returned undecorated, so it costs
+    nothing.
+    """
+    def decorate(function):
+        if metrics is None:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            outer = getattr(current_operation, "name", None)
+            current_operation.name = operation
+            waited = getattr(current_operation, "waited", 0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                waited = getattr(current_operation, "waited", 0.0) - waited
+                metrics.observe(
+                    operation,
+                    time.perf_counter() - start - waited,
+                    len(flashcards),
+                )
+                current_operation.name = outer
+                export_metrics()
+        return wrapper
+    return decorate
+
+
+def count_waiting(seconds):
+    """
+    Adds time this thread spent waiting for input, which instrumented
+    operations leave out of their durations.
+    """
+    current_operation.waited = (
+        getattr(current_operation, "waited", 0.0) + seconds
+    )
+
+
+def count_bytes(direction, amount):
+    """
+    Adds bytes "read" or "written" to the current instrumented operation.
+    """
+    if metrics is not None:
+        operation = getattr(current_operation, "name", None) or "other"
+        metrics.add_bytes(operation, direction, amount)
+
+
+def export_metrics(force=False):
+    """
+    Writes the metrics file, at most once every METRICS_EXPORT_SECONDS
+    unless forced. If the file cannot be written, the error is reported
+    once and the metrics file is no longer exported.
+    """
+    global metrics_file
+    if not metrics_file:
+        return
+    now = time.monotonic()
+    if not force and now - metrics.exported < METRICS_EXPORT_SECONDS:
+        return
+    metrics.exported = now
+    try:
+        path = metrics_file.format(pid=os.getpid())
+        with open(path + ".tmp", "w") as file:
+            file.write(metrics.render())
+        os.replace(path + ".tmp", path)
+    except (OSError, KeyError, IndexError, ValueError):
+        print_error(f"\nUnable to write metrics to {metrics_file}.")
+        metrics_file = None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics to any GET request.
+    """
+
+    def do_GET(self):
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep requests out of the session's terminal
+
+
+def start_metrics():
+    """
+    Starts exporting metrics if they are enabled: the metrics file is also
+    written at exit, and the HTTP endpoint is served on localhost from a
+    background thread.
+    """
+    if metrics is None:
+        return
+    if metrics_file:
+        atexit.register(export_metrics, force=True)
+    if metrics_port:
+        try:
+            server = ThreadingHTTPServer(
+                ("127.0.0.1", int(metrics_port)), MetricsHandler
+            )
+        except (OSError, ValueError):
+            print_error(f"\nUnable to serve metrics on port {metrics_port}.")
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+# --- User Functions ---
+
+
+def user_directory(user):
+    """
+    Returns the directory holding a user's files under users_directory.
+    Users are spread over 256 subdirectories by a hash of their name, so
+    no one directory grows too large. Characters other than letters,
+    digits, "_" and "-" are percent-encoded, so different names never
+    share a directory; an encoded name longer than USER_NAME_MAX is cut
+    short and followed by the SHA-256 of the whole name.
+    """
+    name = user.strip().lower()
+    shard = hashlib.sha1(name.encode()).hexdigest()[:2]
+    encoded = re.sub(
+        r"[^a-z0-9_-]+",
+        lambda match: "".join(
+            f"%{byte:02x}" for byte in match.group().encode()
+        ),
+        name,
+    )
+    if len(encoded) > USER_NAME_MAX:
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        encoded = f"{encoded[:USER_NAME_MAX]}-{digest}"
+    return os.path.join(users_directory, shard, encoded)
+
+
+def ask_user():
+    """
+    Asks for the user's name until one with a letter or digit is given.
+    """
+    while True:
+        user = read_input("\nEnter your user name:\n").strip()
+        if re.search(r"[a-z0-9]", user.lower()):
+            return user
+        print_error("\nPlease enter a name with a letter or number.")
+
+
+def enter_user_directory():
+    """
+    With per-user storage, moves this process into the user's directory,
+    creating it the first time, so every file opened from then on is
+    theirs. The user is named by QUIZ_CARDS_USER or asked for.
+    """
+    if not users_directory:
+        return
+    user = os.environ.get("QUIZ_CARDS_USER") or ask_user()
+    directory = user_directory(user)
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+
+
+def close_deck():
+    """
+    Writes any pending changes and lets go of the background saver, the
+    database connection and the card statistics, so the session server
+    can drop a user's deck from memory.
+    """
+    global saver, database, card_stats
+    with storage_lock:
+        if saver is not None:
+            saver.stop()
+            atexit.unregister(flush_saves)
+            saver = None
+        if database is not None:
+            database.close()
+            database = None
+        if card_stats is not None:
+            card_stats.close()
+            card_stats = None
+
+
+# --- Core Setup Functions ---
+
+
+def initialize_progress_file():
+    """
+    Initializes the progress tracking file. Creates an empty line-delimited
+    progress file if it does not exist, migrating the entries of a legacy
+    list-based progress.json into it the first time.
+    """
+    if storage_mode == "sqlite":
+        connect_database()  # Progress lives in the progress table
+        return
+    if os.path.exists(progress_file):
+        return
+    if os.path.exists(legacy_progress_file):
+        migrate_progress_file()
+    else:
+        open(progress_file, "a").close()  # Never truncates another's saves
+
+
+def migrate_progress_file():
+    """
+    Converts the list-based progress.json into progress.jsonl, one entry per
+    line. The legacy file is left in place; it is ignored once
+    progress.jsonl exists. Invalid legacy data starts an empty history.
+    """
+    try:
+        with open(legacy_progress_file, "r") as file:
+            data = json.load(file)
+        if not isinstance(data, list):  # Reset if data is not a list
+            raise ValueError("Progress data is not a list.")
+    except (json.JSONDecodeError, ValueError):
+        data = []
+        emit(
+            "Progress file initialized as an empty list due to "
+            "invalid data."
+        )
+    temp_filename = progress_file + ".tmp"
+    with open(temp_filename, "w") as file:
+        for entry in data:
+            file.write(json.dumps(entry) + "\n")
+    os.replace(temp_filename, progress_file)
+    if data:
+        emit(f"\nMigrated {len(data)} progress entries to {progress_file}.")
+
+
+def read_progress():
+    """
+    Yields progress entries one at a time from the progress file, skipping
+    lines that cannot be parsed (e.g. an interrupted write). Yields
+    nothing if there is no progress file yet.
+    """
+    if storage_mode == "sqlite":
+        yield from read_database_progress()
+        return
+    try:
+        file = open(progress_file, "rb")
+    except FileNotFoundError:
+        return
+    with file:
+        try:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        finally:
+            count_bytes("read", file.tell())
+
+
+@instrumented("load_flashcards")
+def load_flashcards(filename=deck_file):
+    """
+    Loads the flashcards and remembers which saved version of the deck
+    they match, so changes saved by other processes can be detected. The
+    version is taken first, so a change saved while loading is not missed.
+    """
+    global deck_version
+    version = storage_version(filename)
+    read_flashcards(filename)
+    deck_version = version
+
+
+def read_flashcards(filename=deck_file):
+    """
+    Reads flashcards from the specified JSON file. If the file is missing,
+    starts with an empty flashcard list. If data is corrupted, initializes
+    with an empty list and displays an error message.
+    In SQLite mode the flashcards are loaded from the cards table instead.
+    """
+    global flashcards, search_index, term_index
+    search_index = term_index = None  # Built again when next needed
+    if storage_mode == "sqlite" and connect_database(filename):
+        flashcards = load_database_flashcards()
+        assign_card_ids()
+        rebuild_category_index()
+        emit("\nQuiz Cards loaded successfully.")
+        return
+    if storage_mode == "lazy":
+        load_lazy_flashcards(filename)
+        emit("\nQuiz Cards loaded successfully.")
+        return
+    try:
+        signature, indexed = read_snapshot(filename)
+        # The journal also holds changes made in journal mode
+        while not replay_journal(filename, signature):
+            signature, indexed = read_snapshot(filename)  # Compacted
+    except json.JSONDecodeError:
+        print_error("\nCorrupted file. Starting with an empty list.")
+        flashcards = []
+        rebuild_category_index()
+        return
+    if signature is None:
+        emit("\nNo saved Quiz Cards found. Starting with an empty list.")
+    else:
+        emit("\nQuiz Cards loaded successfully.")
+    assigned = assign_card_ids()
+    if assigned:
+        compact_journal(filename)  # Save the ids given to older cards
+    if assigned or journal_offset or not indexed:
+        rebuild_category_index()
+
+
+@instrumented("save_flashcards")
+def save_flashcards(filename=deck_file):
+    """
+    Saves all flashcards and returns whether that succeeded. The file is
+    written under a temporary name and swapped in, so other processes
+    never read a half-written deck.
+    """
+    if storage_mode == "lazy":
+        compact_lazy_deck()
+        emit("\nQuiz Cards saved successfully.")
+        return True
+    temp_filename = filename + ".tmp"
+    try:
+        with open(temp_filename, "w") as file:
+            json.dump(flashcards, file, indent=4, default=Flashcard.to_dict)
+            count_bytes("written", file.tell())
+        os.replace(temp_filename, filename)
+        drop_pending_saves(filename)
+        emit("\nQuiz Cards saved successfully.")
+        return True
+    except IOError:
+        print_error("\nUnable to save Quiz Cards.")
+        return False
+
+
+def assign_card_ids():
+    """
+    Gives every flashcard without an id, e.g. from a deck saved before
+    cards had ids, the next free id, and sets next_card_id past the
+    highest id in the deck. Returns the number of ids given.
+    """
+    global next_card_id
+    next_card_id = max(
+        (flashcard.card_id or 0 for flashcard in flashcards), default=0
+    ) + 1
+    assigned = 0
+    for flashcard in flashcards:
+        if flashcard.card_id is None:
+            flashcard.card_id = new_card_id()
+            assigned += 1
+    return assigned
+
+
+def new_card_id():
+    """
+    Returns a new flashcard id. Ids only ever increase, so the deck stays
+    sorted by id as cards are appended.
+    """
+    global next_card_id
+    card_id = next_card_id
+    next_card_id += 1
+    return card_id
+
+
+def card_id_position(card_id):
+    """
+    Returns the position of the first flashcard whose id is at least
+    card_id, found by binary search because ids rise through the deck.
+    """
+    low, high = 0, len(flashcards)
+    while low < high:
+        middle = (low + high) // 2
+        if card_id_at(middle) < card_id:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def card_id_at(position):
+    """
+    Returns the id of the flashcard at a position, 0 if it has none. A
+    lazy deck holds the ids, so no card is decoded.
+    """
+    if storage_mode == "lazy":
+        return flashcards.ids[position]
+    return flashcards[position].card_id or 0
+
+
+def find_card(card_id):
+    """
+    Returns the flashcard with the given id, or None if it was deleted.
+    """
+    position = card_position(card_id)
+    return None if position is None else flashcards[position]
+
+
+def replace_flashcards(cards, filename=deck_file):
+    """
+    Replaces the whole deck with the given cards and saves it in a single
+    write for the current storage mode, then rebuilds the indexes. Used by
+    commands that change many cards at once.
+    """
+    global flashcards, search_index, term_index
+    search_index = term_index = None
+    if storage_mode == "lazy":
+        write_lazy_deck(lazy_deck_path(filename), cards)
+        if os.path.exists(lazy_index_path(filename)):
+            os.remove(lazy_index_path(filename))
+        load_lazy_flashcards(filename)  # Indexes the new file
+        return
+    flashcards = cards
+    if storage_mode == "sqlite":
+        with connect_database(filename):
+            database.execute("DELETE FROM cards")
+            insert_database_cards(cards)
+    else:
+        compact_journal(filename)  # Also drops any pending journal
+    rebuild_category_index()
+
+
+# --- Storage Locking Functions ---
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive advisory lock on path + ".lock", so writers in
+    different processes take turns. Readers never take it: full rewrites
+    go through a temporary file and os.replace and appends are whole
+    lines, so a reader always sees a complete file. Must be called with
+    storage_lock held.
+    """
+    acquire_file_lock(path)
+    try:
+        yield
+    finally:
+        release_file_lock(path)
+
+
+def acquire_file_lock(path):
+    """
+    Takes the lock held by file_lock. Taking a lock this process already
+    holds only counts it, so it is released by the matching last release.
+    """
+    lock_path = path + ".lock"
+    if lock_path in held_locks:
+        held_locks[lock_path][1] += 1
+        return
+    lock = open(lock_path, "a")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    held_locks[lock_path] = [lock, 1]
+
+
+def release_file_lock(path):
+    """
+    Releases a lock taken by acquire_file_lock.
+    """
+    lock_path = path + ".lock"
+    held = held_locks[lock_path]
+    held[1] -= 1
+    if not held[1]:
+        del held_locks[lock_path]
+        fcntl.flock(held[0], fcntl.LOCK_UN)
+        held[0].close()
+
+
+@contextlib.contextmanager
+def storage_transaction(filename=deck_file):
+    """
+    Wraps a change to the deck. Takes storage_lock and the deck's file
+    lock, brings the deck up to date with changes other processes have
+    saved, and records the saved version once the change is written.
+    Cards chosen before the transaction should be found again by id.
+    """
+    global deck_version
+    with storage_lock, file_lock(filename):
+        sync_flashcards(filename)
+        try:
+            yield
+        finally:
+            deck_version = storage_version(filename)
+
+
+def storage_version(filename=deck_file):
+    """
+    Returns a value that changes whenever any process saves a change to
+    the deck: SQLite's data version, the size and inode of a lazy deck,
+    or the snapshot's size, modification time and inode and the journal
+    size. Every rewrite swaps in a new file, so the inode tells apart
+    rewrites the clock is too coarse to.
+    """
+    if storage_mode == "sqlite":
+        return connect_database(filename).execute(
+            "PRAGMA data_version"
+        ).fetchone()[0]
+    if storage_mode == "lazy":
+        try:
+            stat = os.stat(lazy_deck_path(filename))
+        except FileNotFoundError:
+            return None
+        return [stat.st_ino, stat.st_size]
+    try:
+        stat = os.stat(filename)
+        snapshot = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+    except FileNotFoundError:
+        snapshot = None
+    try:
+        journal_size = os.path.getsize(journal_path(filename))
+    except FileNotFoundError:
+        journal_size = 0
+    return [snapshot, journal_size]
+
+
+def sync_flashcards(filename=deck_file):
+    """
+    Brings the in-memory deck up to date with changes other processes
+    have saved since it was loaded or last changed here. Changes appended
+    to a journal or lazy deck are applied from where this process left
+    off; anything else reloads the deck. Called with the file lock held.
+    """
+    version = storage_version(filename)
+    if version == deck_version:
+        return
+    appended = (
+        deck_version is not None
+        and version is not None
+        and storage_mode in ("journal", "lazy")
+        and version[0] == deck_version[0]
+        and version[1] >= deck_version[1]
+    )
+    if appended and storage_mode == "lazy":
+        scan_lazy_deck()  # Also updates the indexes
+    elif appended:
+        replay_journal_tail(filename)
+    else:
+        shown = len(screen_buffer())
+        load_flashcards(filename)
+        del screen_buffer()[shown:]  # Only the messages from loading
+        if saver is not None and saver.filename == filename:
+            saver.reapply()  # Changes still waiting to be written
+
+
+def card_position(card_id):
+    """
+    Returns the position of the flashcard with the given id, or None if
+    there is none.
+    """
+    position = card_id_position(card_id)
+    if position < len(flashcards) and flashcards[position].card_id == card_id:
+        return position
+    return None
+
+
+# --- Background Saving Functions ---
+
+
+class BackgroundSaver:
+    """
+    Writes the deck on a background thread once no change has been made
+    for save_delay seconds, so a burst of changes costs one write and the
+    menus never wait for it. The deck's file lock is only taken for the
+    write itself. Each unsaved change is kept, by card id, until it is
+    written, so if another process saves the deck meanwhile the deck is
+    reloaded and the unsaved changes applied again before writing.
+    """
+
+    def __init__(self, filename=deck_file):
+        self.filename = filename
+        self.pending = []  # (op, card in JSON form) not yet written
+        self.due = None  # When the pending changes are written, if any
+        self.deadline = None  # Latest time a burst may be written
+        self.stopped = False
+        self.condition = threading.Condition(storage_lock)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def schedule(self, changes):
+        """
+        Records (op, position, flashcard) changes to be written. Called
+        with storage_lock held.
+        """
+        now = time.monotonic()
+        self.pending.extend(
+            (op, flashcard.to_dict()) for op, _, flashcard in changes
+        )
+        if self.due is None:
+            self.deadline = now + SAVE_MAX_DELAYS * save_delay
+        self.due = min(now + save_delay, self.deadline)
+        self.condition.notify()
+
+    def reapply(self):
+        """
+        Applies the pending changes again after the deck was reloaded,
+        finding cards by id. Edits and deletes of cards another process
+        deleted are dropped. A card added here whose id another process
+        also gave out is given a new one. Called with storage_lock held.
+        """
+        global next_card_id, search_index, term_index
+        renamed = {}  # Id given out twice -> the card's new id
+        pending = []
+        for op, card in self.pending:
+            card = dict(card, id=renamed.get(card["id"], card["id"]))
+            position = card_position(card["id"])
+            if op == "add" and position is None:
+                flashcards.insert(
+                    card_id_position(card["id"]), Flashcard.from_dict(card)
+                )
+                next_card_id = max(next_card_id, card["id"] + 1)
+            elif op == "add":
+                if flashcards[position].to_dict() == card:
+                    continue  # Already saved
+                renamed[card["id"]] = card["id"] = new_card_id()
+                flashcards.append(Flashcard.from_dict(card))
+            elif position is None:
+                continue  # Deleted by another process
+            elif op == "edit":
+                flashcards[position] = Flashcard.from_dict(card)
+            else:
+                del flashcards[position]
+            pending.append((op, card))
+        self.pending = pending
+        rebuild_category_index()
+        search_index = term_index = None  # Built again when next needed
+
+    def run(self):
+        """
+        Waits for changes and writes them once they are due. Messages are
+        only shown if the write failed.
+        """
+        with self.condition:
+            while not self.stopped:
+                if self.due is None:
+                    self.condition.wait()
+                elif self.due > time.monotonic():
+                    self.condition.wait(self.due - time.monotonic())
+                elif self.flush():
+                    screen_buffer().clear()
+                else:
+                    flush_screen()
+
+    def flush(self):
+        """
+        Writes the pending changes now, returning False if that failed.
+        Called with storage_lock held.
+        """
+        global deck_version
+        self.due = self.deadline = None
+        if not self.pending:
+            return True
+        with file_lock(self.filename):
+            sync_flashcards(self.filename)  # Reapplies pending changes
+            saved = save_flashcards(self.filename)
+            deck_version = storage_version(self.filename)
+        return saved
+
+    def stop(self):
+        """
+        Writes any pending changes and ends the thread. Called with
+        storage_lock held.
+        """
+        self.flush()
+        self.stopped = True
+        self.condition.notify()
+
+
+def save_changes(changes, filename=deck_file):
+    """
+    Saves the whole deck after (op, position, flashcard) changes: at once,
+    or in json mode with save_delay set, by the background saver once
+    changes pause.
+    """
+    global saver
+    if not save_delay or storage_mode != "json":
+        save_flashcards(filename)
+        return
+    if saver is None:
+        saver = BackgroundSaver(filename)
+        atexit.register(flush_saves)
+    saver.schedule(changes)
+
+
+def drop_pending_saves(filename=deck_file):
+    """
+    Forgets the background saver's pending changes once the whole deck,
+    which includes them, has been written.
+    """
+    if saver is not None and saver.filename == filename:
+        saver.pending.clear()
+
+
+def flush_saves():
+    """
+    Writes any changes the background saver is still holding. Runs on
+    exit, including exits caused by exit_on_signal.
+    """
+    if saver is not None:
+        with storage_lock:
+            saver.flush()
+
+
+def exit_on_signal(signum, frame):
+    """
+    Turns SIGTERM and SIGHUP into a normal exit, so pending changes are
+    flushed instead of lost.
+    """
+    sys.exit(128 + signum)
+
+
+def handle_exit_signals():
+    """
+    Installs exit_on_signal when changes may be held back for saving.
+    """
+    if save_delay:
+        signal.signal(signal.SIGTERM, exit_on_signal)
+        signal.signal(signal.SIGHUP, exit_on_signal)
+
+
+# --- Category Index Functions ---
+
+
+def card_category(flashcard):
+    """
+    Returns the category a flashcard is listed under.
+    """
+    return flashcard["category"] or "Uncategorized"
+
+
+def rebuild_category_index():
+    """
+    Rebuilds the category index from scratch. Only needed after the whole
+    deck has been (re)loaded; single changes update the index in place.
+    """
+    category_index.clear()
+    for position, flashcard in enumerate(flashcards):
+        category_index.setdefault(card_category(flashcard), []).append(
+            position
+        )
+
+
+def index_card(position):
+    """
+    Adds the flashcard at the given position to the category index and,
+    once it has been built, the search index.
+    """
+    flashcard = flashcards[position]
+    positions = category_index.setdefault(card_category(flashcard), [])
+    if not positions or positions[-1] < position:
+        positions.append(position)
+    else:
+        bisect.insort(positions, position)
+    index_words(flashcard, 1)
+
+
+def unindex_card(position):
+    """
+    Removes the flashcard at the given position from the category index,
+    dropping its category once it has no cards left, and from the search
+    index once it has been built.
+    """
+    flashcard = flashcards[position]
+    category = card_category(flashcard)
+    positions = category_index[category]
+    del positions[bisect.bisect_left(positions, position)]
+    if not positions:
+        del category_index[category]
+    index_words(flashcard, -1)
+
+
+def index_words(flashcard, change):
+    """
+    Adds (change 1) or removes (change -1) a flashcard in the search and
+    term indexes that have been built. A lazy deck with an unread saved
+    search index keeps the change to apply once it is read.
+    """
+    if search_index is not None:
+        if change > 0:
+            add_search_words(flashcard)
+        else:
+            remove_search_words(flashcard)
+    elif storage_mode == "lazy" and flashcards.saved_words is not None:
+        flashcards.word_changes.append((change, flashcard.to_dict()))
+    if term_index is not None:
+        count_term(flashcard, change)
+
+
+def shift_category_index(position):
+    """
+    Moves every indexed position after a deleted flashcard down by one so
+    the index matches the list once the flashcard has been removed.
+    """
+    for positions in category_index.values():
+        for i in range(bisect.bisect_right(positions, position),
+                       len(positions)):
+            positions[i] -= 1
+
+
+def get_categories():
+    """
+    Returns the sorted category names from the category index.
+    """
+    with storage_lock:  # Not while another session rebuilds it
+        return sorted(category_index)
+
+
+class DeckView:
+    """
+    A read-only sequence of the flashcards with the given ids, so
+    selecting a category neither copies its cards nor, for a lazy deck,
+    decodes them before they are displayed or quizzed. Each card is
+    looked up by id when it is read, so the view stays valid while other
+    sessions sharing the deck change it: a card deleted since reads as
+    None and an edited card reads as it is now.
+    """
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        card_id = self.ids[index]
+        with storage_lock:
+            return find_card(card_id)
+
+
+def deck_view(positions=None):
+    """
+    Returns a DeckView of the flashcards at the given positions, or of
+    the whole deck. Must be called with storage_lock held, or the
+    positions may no longer be those of the cards meant.
+    """
+    if positions is None:
+        if storage_mode == "lazy":
+            return DeckView(array("Q", flashcards.ids))
+        positions = range(len(flashcards))
+    return DeckView(array("Q", map(card_id_at, positions)))
+
+
+def all_flashcards():
+    """
+    Returns a DeckView of every flashcard, in deck order.
+    """
+    with storage_lock:
+        return deck_view()
+
+
+def get_category_flashcards(category):
+    """
+    Returns a DeckView of the flashcards in a category, in deck order,
+    using the category index rather than scanning the whole deck.
+    """
+    if storage_mode == "sqlite":
+        return DeckView(get_database_category_ids(category))
+    with storage_lock:
+        return deck_view(category_index.get(category, ()))
+
+
+# --- Search Index Functions ---
+
+
+def search_words(text):
+    """
+    Splits text into the lower-case words used by the search index.
+    """
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def card_words(flashcard):
+    """
+    Returns the words of a flashcard's term and definition.
+    """
+    return search_words(flashcard["term"] + " " + flashcard["definition"])
+
+
+def get_search_index():
+    """
+    Returns the search index, reading it from a lazy deck's side index or
+    otherwise building it on the first search. Each word maps to an array
+    of the ids of the cards that use it; ids rise through the deck, so
+    building only ever appends.
+    """
+    global search_index
+    if search_index is None and storage_mode == "lazy" and (
+        flashcards.saved_words is not None
+    ):
+        read_saved_words(flashcards)
+    elif search_index is None:
+        index = {}
+        for flashcard in flashcards:
+            for word in card_words(flashcard):
+                index.setdefault(word, array("I")).append(flashcard.card_id)
+        search_index = index
+    return search_index
+
+
+def read_saved_words(deck):
+    """
+    Makes the search index the one saved in a lazy deck's side index,
+    with the changes made since it was saved applied.
+    """
+    global search_index
+    file, offset, size, changes = deck.saved_words
+    with file:
+        file.seek(offset)
+        packed = marshal.loads(file.read(size))
+        count_bytes("read", size)
+    search_index = {}
+    for word, raw in packed.items():
+        card_ids = search_index[word] = array("I")
+        card_ids.frombytes(raw)
+    # Only the search index: the term index already counts these changes
+    for change, card in changes + deck.word_changes:
+        if change > 0:
+            add_search_words(Flashcard.from_dict(card))
+        else:
+            remove_search_words(Flashcard.from_dict(card))
+    deck.saved_words = None
+    deck.word_changes = []
+
+
+def add_search_words(flashcard):
+    """
+    Adds a flashcard's id under each of its words.
+    """
+    for word in card_words(flashcard):
+        card_ids = search_index.setdefault(word, array("I"))
+        if not card_ids or card_ids[-1] < flashcard.card_id:
+            card_ids.append(flashcard.card_id)
+        else:
+            bisect.insort(card_ids, flashcard.card_id)
+
+
+def remove_search_words(flashcard):
+    """
+    Removes a flashcard's id from under each of its words, dropping words
+    no card uses any more.
+    """
+    for word in card_words(flashcard):
+        card_ids = search_index.get(word)
+        if card_ids is None:
+            continue
+        i = bisect.bisect_left(card_ids, flashcard.card_id)
+        if i < len(card_ids) and card_ids[i] == flashcard.card_id:
+            del card_ids[i]
+        if not card_ids:
+            del search_index[word]
+
+
+def search_flashcards(query):
+    """
+    Returns the ids, in deck order, of the flashcards whose term or
+    definition contains every word of the query. Only the ids listed
+    under the query's rarest word are checked against the other words,
+    so the deck itself is never scanned.
+    """
+    words = search_words(query)
+    if not words:
+        return array("Q")
+    index = get_search_index()
+    card_ids = sorted((index.get(word, ()) for word in words), key=len)
+    matches = array("Q")
+    for card_id in card_ids[0]:
+        for others in card_ids[1:]:
+            i = bisect.bisect_left(others, card_id)
+            if i == len(others) or others[i] != card_id:
+                break
+        else:
+            matches.append(card_id)
+    return matches
+
+
+# --- Duplicate Detection Functions ---
+
+
+def normalize_term(term):
+    """
+    Returns the form of a term used to spot duplicates: case and runs of
+    whitespace are ignored.
+    """
+    return " ".join(term.casefold().split())
+
+
+def term_hash(term):
+    """
+    Returns a 64-bit hash of a term's normalised form. Unlike hash(), it
+    is the same in every process, so a lazy deck can save it.
+    """
+    digest = hashlib.blake2b(normalize_term(term).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+def get_term_index():
+    """
+    Returns the term index, building it the first time it is needed. A
+    lazy deck holds every card's term hash, so no card is decoded.
+    """
+    global term_index
+    if term_index is None:
+        if storage_mode == "lazy":
+            term_index = collections.Counter(flashcards.terms)
+        else:
+            term_index = collections.Counter(
+                term_hash(flashcard["term"]) for flashcard in flashcards
+            )
+    return term_index
+
+
+def count_term(flashcard, change):
+    """
+    Adds change to the number of cards with a flashcard's term, dropping
+    terms no card has any more.
+    """
+    key = term_hash(flashcard["term"])
+    count = term_index.get(key, 0) + change
+    if count > 0:
+        term_index[key] = count
+    else:
+        term_index.pop(key, None)
+
+
+def has_term(term):
+    """
+    Returns whether a flashcard with the same normalised term exists, with
+    one dictionary lookup rather than a scan of the deck.
+    """
+    return term_hash(term) in get_term_index()
+
+
+def remove_duplicate_flashcards(filename=deck_file):
+    """
+    Removes every flashcard whose normalised term repeats that of an
+    earlier card, in one pass over the deck, and saves the deck once.
+    Returns the number of cards removed.
+    """
+    seen = set()
+    kept = []
+    for flashcard in flashcards:
+        term = normalize_term(flashcard["term"])
+        if term not in seen:
+            seen.add(term)
+            kept.append(flashcard)
+    removed = len(flashcards) - len(kept)
+    if removed:
+        replace_flashcards(kept, filename)
+    return removed
+
+
+# --- Batch Change Functions ---
+
+
+def apply_batch(card_ids, new_category=None, filename=deck_file):
+    """
+    Deletes the flashcards with the given ids or, if new_category is
+    given, moves them to that category, as one transaction. Deleted cards
+    are only marked with a tombstone while the batch is applied; the deck
+    is then compacted in a single pass instead of shifting once per
+    delete, and the whole batch is saved with exactly one write.
+    """
+    global flashcards
+    with storage_transaction(filename):
+        tombstones = set(map(card_position, card_ids))
+        tombstones.discard(None)  # Deleted by another session meanwhile
+        cards = []
+        changes = []  # (op, position, flashcard), in the order applied
+        for position, flashcard in enumerate(flashcards):
+            if position in tombstones:
+                if new_category is None:
+                    changes.append(("delete", position, flashcard))
+                    continue
+                flashcard["category"] = new_category
+                changes.append(("edit", position, flashcard))
+            cards.append(flashcard)
+
+        if storage_mode == "lazy":
+            replace_flashcards(cards, filename)  # One compaction
+            emit("\nQuiz Cards saved successfully.")
+            return
+        flashcards = cards
+        rebuild_category_index()
+        if new_category is None:
+            for _, _, flashcard in changes:
+                index_words(flashcard, -1)
+            changes.reverse()  # Later positions first keeps indexes valid
+        record_batch(changes, filename)
+
+
+def record_batch(changes, filename=deck_file):
+    """
+    Persists a batch of (op, position, flashcard) changes with one write:
+    a single SQLite transaction, a single journal line holding every
+    change, or one snapshot in json mode.
+    """
+    if storage_mode == "sqlite":
+        record_database_changes(
+            [(op, flashcard) for op, _, flashcard in changes]
+        )
+    elif storage_mode == "journal":
+        append_journal(
+            {
+                "op": "batch",
+                "changes": [journal_entry(*change) for change in changes],
+            },
+            filename,
+        )
+    else:
+        save_changes(changes, filename)
+
+
+# --- Import and Export Functions ---
+
+
+def file_format(path):
+    """
+    Returns "csv" for a .csv file and "jsonl" for anything else.
+    """
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_import_records(path, kind):
+    """
+    Yields the records of a CSV file (with term, definition and category
+    columns) or a JSONL file one at a time. JSONL lines that cannot be
+    parsed are yielded as None.
+    """
+    with open(path, "r", newline="") as file:
+        if kind == "csv":
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def import_card(record):
+    """
+    Returns a flashcard for an imported record, or None if the record has
+    no term or definition. Text is tidied the way add_flashcard tidies
+    typed input.
+    """
+    if not isinstance(record, dict):
+        return None
+    term = str(record.get("term") or "").strip()
+    definition = str(record.get("definition") or "").strip()
+    category = str(record.get("category") or "").strip().title()
+    if not term or not definition:
+        return None
+    return Flashcard(term, definition, category or "Uncategorized")
+
+
+def append_flashcards(cards):
+    """
+    Gives new flashcards ids and appends them to the deck and its indexes.
+    A lazy deck writes them to its file at once; in other modes the
+    caller saves them.
+    """
+    for flashcard in cards:
+        flashcard.card_id = new_card_id()
+    start = len(flashcards)
+    flashcards.extend(cards)
+    for position in range(start, len(flashcards)):
+        index_card(position)
+
+
+def save_appended_flashcards(start, filename=deck_file):
+    """
+    Saves the flashcards appended from position start onwards with a
+    single write.
+    """
+    if storage_mode == "sqlite":
+        with connect_database(filename):
+            insert_database_cards(
+                flashcards[position]
+                for position in range(start, len(flashcards))
+            )
+    elif storage_mode == "lazy":
+        save_lazy_index(filename)  # The cards were written as they came
+    else:
+        compact_journal(filename)  # One snapshot write, journal included
+
+
+def import_flashcards(
+    path, kind, skip_duplicates=True, filename=deck_file
+):
+    """
+    Streams flashcards from a CSV or JSONL file into the deck. Records are
+    validated and added IMPORT_BATCH_SIZE at a time, so only one batch of
+    the input is held in memory, and the deck is saved once at the end.
+    Returns the number of cards imported, invalid records skipped and
+    duplicate terms skipped.
+    """
+    start = len(flashcards)
+    invalid = duplicates = 0
+    batch = []
+    batch_terms = set()  # Terms in the batch, not yet in the term index
+    for record in read_import_records(path, kind):
+        flashcard = import_card(record)
+        if flashcard is None:
+            invalid += 1
+            continue
+        if skip_duplicates:
+            term = normalize_term(flashcard.term)
+            if term in batch_terms or has_term(term):
+                duplicates += 1
+                continue
+            batch_terms.add(term)
+        batch.append(flashcard)
+        if len(batch) == IMPORT_BATCH_SIZE:
+            append_flashcards(batch)
+            batch = []
+            batch_terms.clear()
+    append_flashcards(batch)
+    save_appended_flashcards(start, filename)
+    return len(flashcards) - start, invalid, duplicates
+
+
+def export_flashcards(path, kind):
+    """
+    Writes every flashcard to a CSV or JSONL file, one card at a time, and
+    returns the number written.
+    """
+    with open(path, "w", newline="") as file:
+        if kind == "csv":
+            writer = csv.writer(file)
+            writer.writerow(Flashcard.fields)
+        for flashcard in flashcards:
+            if kind == "csv":
+                writer.writerow([flashcard[key] for key in Flashcard.fields])
+            else:
+                record = {key: flashcard[key] for key in Flashcard.fields}
+                file.write(json.dumps(record) + "\n")
+    return len(flashcards)
+
+
+# --- Snapshot Cache Functions ---
+
+
+def snapshot_cache_path(filename=deck_file):
+    """
+    Returns the file caching the parsed form of a flashcard snapshot,
+    e.g. flashcards.json.cache for flashcards.json.
+    """
+    return filename + ".cache"
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """
+    Pauses the cyclic garbage collector while a deck is built. Cards hold
+    no cycles, but creating a million of them would otherwise set off
+    collections that scan every card already made, tripling load time.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_snapshot_cache(filename, key):
+    """
+    Loads the flashcards and category index from the snapshot cache if it
+    was written for the snapshot identified by key: its size,
+    modification time and content hash, named on its first line. Returns
+    whether it was. The cards follow as columns of plain values, which
+    marshal reads back at close to the speed of copying them.
+    """
+    global flashcards
+    try:
+        with open(snapshot_cache_path(filename), "rb") as file:
+            if json.loads(file.readline()) != SNAPSHOT_CACHE_FORMAT + key:
+                return False
+            data = file.read()  # marshal reads bytes faster than files
+        terms, definitions, categories, card_ids, index = marshal.loads(data)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+        return False
+    flashcards = list(map(Flashcard, terms, definitions, categories, card_ids))
+    category_index.clear()
+    for category, packed in index.items():
+        positions = array("I")
+        positions.frombytes(packed)
+        category_index[category] = positions
+    count_bytes("read", len(data))
+    return True
+
+
+def write_snapshot_cache(filename, key):
+    """
+    Saves the flashcards just parsed from the snapshot identified by key,
+    with their category index, so the next load can skip parsing. Loads in
+    other processes write it too, so each uses its own temp file. The
+    cache is only a shortcut, so failing to write it is not an error.
+    """
+    index = {}
+    for position, flashcard in enumerate(flashcards):
+        index.setdefault(card_category(flashcard), array("I")).append(
+            position
+        )
+    path = snapshot_cache_path(filename)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(json.dumps(SNAPSHOT_CACHE_FORMAT + key).encode())
+            file.write(b"\n")
+            marshal.dump(
+                (
+                    [flashcard.term for flashcard in flashcards],
+                    [flashcard.definition for flashcard in flashcards],
+                    [flashcard.category for flashcard in flashcards],
+                    [flashcard.card_id for flashcard in flashcards],
+                    {
+                        category: positions.tobytes()
+                        for category, positions in index.items()
+                    },
+                ),
+                file,
+            )
+            count_bytes("written", file.tell())
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+# --- Change Journal Functions ---
+
+
+def journal_path(filename=deck_file):
+    """
+    Returns the journal file that belongs to a flashcard snapshot,
+    e.g. flashcards.journal for flashcards.json.
+    """
+    return os.path.splitext(filename)[0] + ".journal"
+
+
+def snapshot_signature(filename=deck_file):
+    """
+    Returns the size and modification time of the snapshot file, or None if
+    it does not exist. Journals record the signature of the snapshot they
+    apply to, so a journal left behind by an interrupted compaction is
+    recognised as stale instead of being replayed twice.
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_snapshot(filename=deck_file):
+    """
+    Reads the flashcards from the snapshot file. Returns the signature of
+    the file that was read, or None if there is no snapshot, and whether
+    the category index was loaded with the cards. The parsed deck comes
+    from the snapshot cache when that was written for this file's size,
+    modification time and content; otherwise the file is parsed and the
+    cache rewritten.
+    """
+    global flashcards
+    try:
+        with open(filename, "rb") as file:
+            data = file.read()
+            stat = os.fstat(file.fileno())
+    except FileNotFoundError:
+        flashcards = []
+        return None, False
+    count_bytes("read", stat.st_size)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    key = signature + [hashlib.sha1(data).hexdigest()]
+    with gc_paused():
+        if read_snapshot_cache(filename, key):
+            return signature, True
+        flashcards = json.loads(data, object_hook=Flashcard.from_dict)
+    write_snapshot_cache(filename, key)
+    return signature, False
+
+
+def journal_base(path):
+    """
+    Returns the snapshot signature recorded in a journal's header, or
+    False if the header is unreadable.
+    """
+    with open(path, "rb") as file:
+        header = file.readline()
+    try:
+        return json.loads(header)["base"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return False
+
+
+def replay_journal(filename=deck_file, signature=None):
+    """
+    Applies the changes recorded in the journal on top of the flashcards
+    loaded from the snapshot with the given signature, ignoring a
+    partially written last line. Returns False, applying nothing, if the
+    snapshot was compacted by another process after it was read, so it
+    must be read again. Discards a stale journal. Sets journal_offset to
+    the end of the last entry applied, which may be past the size the
+    deck's version recorded if another process appended while this one
+    was loading.
+    """
+    global journal_offset
+    journal_offset = 0
+    path = journal_path(filename)
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return True
+    with file:
+        header = file.readline()
+        try:
+            base = json.loads(header)["base"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            base = False
+        if base != signature:
+            if signature != snapshot_signature(filename):
+                return False
+            remove_stale_journal(filename)
+            return True
+        count_bytes("read", os.fstat(file.fileno()).st_size)
+        offset = len(header)
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Interrupted write, nothing after it was saved
+            apply_journal_entry(entry)
+            offset += len(line)
+    journal_offset = offset
+    return True
+
+
+def remove_stale_journal(filename=deck_file):
+    """
+    Removes a journal left behind by an interrupted compaction. Checked
+    again under the file lock, since a writer may have started a new
+    journal for the current snapshot meanwhile.
+    """
+    path = journal_path(filename)
+    with storage_lock, file_lock(filename):
+        try:
+            if journal_base(path) != snapshot_signature(filename):
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def replay_journal_tail(filename=deck_file):
+    """
+    Applies the journal entries another process appended after
+    journal_offset, keeping the indexes up to date.
+    """
+    global journal_offset
+    with open(journal_path(filename), "rb") as file:
+        file.seek(journal_offset)
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Interrupted write, nothing after it was saved
+            if "op" in entry:  # Not the header of a new journal
+                apply_journal_entry(entry, indexed=True)
+            journal_offset += len(line)
+
+
+def apply_journal_entry(entry, indexed=False):
+    """
+    Applies one journal entry to the flashcards, also updating the indexes
+    if indexed is set. A batch entry holds several changes, applied in
+    order.
+    """
+    global next_card_id
+    op = entry["op"]
+    if op == "batch":
+        for change in entry["changes"]:
+            apply_journal_entry(change, indexed)
+        return
+    index = entry["index"]
+    if indexed and op != "add":
+        unindex_card(index)
+    if op == "add":
+        flashcard = Flashcard.from_dict(entry["card"])
+        flashcards.append(flashcard)
+        index = len(flashcards) - 1
+        next_card_id = max(next_card_id, (flashcard.card_id or 0) + 1)
+    elif op == "edit":
+        flashcards[index] = Flashcard.from_dict(entry["card"])
+    elif op == "delete":
+        if indexed:
+            shift_category_index(index)
+        del flashcards[index]
+        return
+    if indexed:
+        index_card(index)
+
+
+def journal_entry(op, index, flashcard=None):
+    """
+    Returns the journal entry recording one add, edit or delete.
+    """
+    entry = {"op": op, "index": index}
+    if op != "delete":
+        entry["card"] = flashcard.to_dict()
+    return entry
+
+
+def record_change(op, index, flashcard=None, filename=deck_file):
+    """
+    Persists a single add, edit or delete. In journal mode the change is
+    appended to the journal as one line and the snapshot is only rewritten
+    once the journal passes JOURNAL_COMPACT_BYTES. In SQLite mode only the
+    changed row is written. In json mode all flashcards are saved, at once
+    or by the background saver if save_delay is set.
+    """
+    if storage_mode == "sqlite":
+        record_database_change(op, flashcard)
+        return
+    if storage_mode == "lazy":  # The deck appended the change itself
+        if flashcards.records > 2 * len(flashcards) + LAZY_COMPACT_RECORDS:
+            compact_lazy_deck()
+        emit("\nQuiz Cards saved successfully.")
+        return
+    if storage_mode != "journal":
+        save_changes([(op, index, flashcard)], filename)
+        return
+
+    append_journal(journal_entry(op, index, flashcard), filename)
+
+
+def append_journal(entry, filename=deck_file):
+    """
+    Appends one entry to the journal as a single line, compacting the
+    journal once it passes JOURNAL_COMPACT_BYTES.
+    """
+    global journal_offset
+    path = journal_path(filename)
+    try:
+        with open(path, "a") as file:
+            if file.tell() == 0:  # New journal, record which snapshot
+                header = {"base": snapshot_signature(filename)}
+                file.write(json.dumps(header) + "\n")
+            start = file.tell()
+            file.write(json.dumps(entry) + "\n")
+            journal_size = file.tell()
+        journal_offset = journal_size  # Synced first, so nothing is skipped
+        count_bytes("written", journal_size - start)
+        emit("\nQuiz Cards saved successfully.")
+    except IOError:
+        print_error("\nUnable to save Quiz Cards.")
+        return
+
+    if journal_size > JOURNAL_COMPACT_BYTES:
+        compact_journal(filename)
+
+
+def compact_journal(filename=deck_file):
+    """
+    Folds the journal back into the snapshot. The new snapshot is written
+    to a temporary file and swapped in before the journal is removed.
+    """
+    global journal_offset
+    temp_filename = filename + ".tmp"
+    try:
+        with open(temp_filename, "w") as file:
+            json.dump(flashcards, file, indent=4, default=Flashcard.to_dict)
+            count_bytes("written", file.tell())
+        os.replace(temp_filename, filename)
+        drop_pending_saves(filename)
+        if os.path.exists(journal_path(filename)):
+            os.remove(journal_path(filename))
+        journal_offset = 0
+    except IOError:
+        print_error("\nUnable to compact the Quiz Card journal.")
+
+
+# --- Lazy Deck Functions ---
+
+
+class LazyDeck:
+    """
+    Flashcards stored one JSON object per line in a memory-mapped file.
+    Only the byte offset, id and term hash of each card are held in memory
+    and a card is decoded when it is accessed. Adds, edits and deletes are
+    appended to the file as records, so it is only rewritten by
+    compact_lazy_deck. A search index saved in the side index is only
+    read at the first search; changes made before then are kept in
+    word_changes and applied to it once it is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array("Q")  # Offset of each card's line, in order
+        self.ids = array("Q")  # Id of each card, 0 for a card without one
+        self.terms = array("Q")  # term_hash of each card's term
+        self.records = 0  # Lines in the file, including superseded ones
+        self.size = 0  # Bytes of the file covered by the offsets
+        self.mapping = None
+        self.unnumbered = False  # Holds cards saved before cards had ids
+        # (side index file, offset, size, changes) of a saved search index
+        self.saved_words = None
+        self.word_changes = []  # (change, card in JSON form) since loaded
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+        offset = self.offsets[position]
+        if self.mapping is None or offset >= len(self.mapping):
+            self.remap()
+        end = self.mapping.find(b"\n", offset)
+        return decode_lazy_record(self.mapping[offset:end])
+
+    def __setitem__(self, position, flashcard):
+        position = range(len(self))[position]
+        self.offsets[position] = self.write(
+            {"op": "edit", "index": position, "card": flashcard.to_dict()}
+        )
+        self.ids[position] = flashcard.card_id or 0
+        self.terms[position] = term_hash(flashcard.term)
+
+    def __delitem__(self, position):
+        position = range(len(self))[position]
+        self.write({"op": "delete", "index": position})
+        del self.offsets[position]
+        del self.ids[position]
+        del self.terms[position]
+
+    def append(self, flashcard):
+        self.offsets.append(self.write(flashcard.to_dict()))
+        self.ids.append(flashcard.card_id or 0)
+        self.terms.append(term_hash(flashcard.term))
+
+    def extend(self, cards):
+        """
+        Appends several cards to the file with one write.
+        """
+        with open(self.path, "ab") as file:
+            if file.tell() != self.size:  # Close off an interrupted line
+                file.write(b"\n")
+            for flashcard in cards:
+                self.offsets.append(file.tell())
+                self.ids.append(flashcard.card_id or 0)
+                self.terms.append(term_hash(flashcard.term))
+                file.write(json.dumps(flashcard.to_dict()).encode() + b"\n")
+            self.size = file.tell()
+        self.records += len(cards)
+
+    def write(self, record):
+        """
+        Appends one record to the file and returns its offset.
+        """
+        with open(self.path, "ab") as file:
+            if file.tell() != self.size:  # Close off an interrupted line
+                file.write(b"\n")
+            offset = file.tell()
+            file.write(json.dumps(record).encode() + b"\n")
+            self.size = file.tell()
+        count_bytes("written", self.size - offset)
+        self.records += 1
+        return offset
+
+    def remap(self):
+        """
+        Maps the file again after it has grown.
+        """
+        if self.mapping is not None:
+            self.mapping.close()
+        with open(self.path, "rb") as file:
+            self.mapping = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+
+def decode_lazy_record(line):
+    """
+    Decodes a card line, or the card carried by an edit record.
+    """
+    data = json.loads(line)
+    return Flashcard.from_dict(data["card"] if "op" in data else data)
+
+
+def lazy_deck_path(filename=deck_file):
+    """
+    Returns the one-card-per-line deck used in lazy mode.
+    """
+    return os.path.splitext(filename)[0] + ".jsonl"
+
+
+def lazy_index_path(filename=deck_file):
+    """
+    Returns the side index holding a lazy deck's offsets and categories.
+    """
+    return lazy_deck_path(filename) + ".idx"
+
+
+def load_lazy_flashcards(filename=deck_file):
+    """
+    Opens the lazy deck, creating it from the JSON flashcards the first
+    time. Offsets and the category index are read from the side index,
+    and only the lines appended since it was written are scanned.
+    """
+    global flashcards, storage_mode, next_card_id
+    path = lazy_deck_path(filename)
+    if not os.path.exists(path):
+        with storage_lock, file_lock(filename):
+            if not os.path.exists(path):  # Not created by another process
+                storage_mode = "json"  # Read the existing files as usual
+                try:
+                    read_flashcards(filename)
+                finally:
+                    storage_mode = "lazy"
+                write_lazy_deck(path, flashcards)
+    flashcards = LazyDeck(path)
+    if not load_lazy_index(filename):
+        category_index.clear()
+        next_card_id = 1
+    if scan_lazy_deck():
+        if flashcards.unnumbered:
+            compact_lazy_deck(filename)  # Gives the older cards ids
+        else:
+            save_lazy_index(filename)
+
+
+def write_lazy_deck(path, cards):
+    """
+    Writes cards one per line to a new lazy deck file via a temporary file
+    and returns the offset, id and term hash of each line. Cards without
+    an id are given one.
+    """
+    offsets, ids, terms = array("Q"), array("Q"), array("Q")
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        for flashcard in cards:
+            if flashcard.card_id is None:
+                flashcard.card_id = new_card_id()
+            offsets.append(file.tell())
+            ids.append(flashcard.card_id)
+            terms.append(term_hash(flashcard.term))
+            file.write(json.dumps(flashcard.to_dict()).encode() + b"\n")
+    os.replace(temp_path, path)
+    return offsets, ids, terms
+
+
+def scan_lazy_deck():
+    """
+    Applies the records after the part of the file already covered by the
+    offsets, updating the indexes and next_card_id as it goes. Returns the
+    number of records read.
+    """
+    global next_card_id
+    deck = flashcards
+    scanned = 0
+    with open(deck.path, "rb") as file:
+        start = file.seek(deck.size)
+        offset = deck.size
+        for line in file:
+            if not line.endswith(b"\n"):
+                break  # Interrupted write, nothing after it was saved
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                offset += len(line)
+                continue
+            op = record.get("op", "add")
+            if op != "delete":
+                card_id = record.get("card", record).get("id")
+                if card_id is None:
+                    deck.unnumbered = True
+                else:
+                    next_card_id = max(next_card_id, card_id + 1)
+            if op == "add":
+                deck.offsets.append(offset)
+                deck.ids.append(card_id or 0)
+                deck.terms.append(term_hash(record["term"]))
+                category_index.setdefault(
+                    record.get("category") or "Uncategorized", []
+                ).append(len(deck.offsets) - 1)
+                index_words(Flashcard.from_dict(record), 1)
+            elif op == "edit":
+                unindex_card(record["index"])
+                deck.offsets[record["index"]] = offset
+                deck.ids[record["index"]] = card_id or 0
+                deck.terms[record["index"]] = term_hash(
+                    record["card"]["term"]
+                )
+                index_card(record["index"])
+            elif op == "delete":
+                unindex_card(record["index"])
+                shift_category_index(record["index"])
+                del deck.offsets[record["index"]]
+                del deck.ids[record["index"]]
+                del deck.terms[record["index"]]
+            offset += len(line)
+            deck.records += 1
+            scanned += 1
+            deck.size = offset
+        count_bytes("read", file.tell() - start)
+    return scanned
 
-# --- Core Setup Functions ---
+
+def load_lazy_index(filename=deck_file):
+    """
+    Loads the offsets, card ids, term hashes and category index saved for
+    the lazy deck, and notes where a saved search index is, to be read at
+    the first search. Returns False if there is no side index or it
+    belongs to a different file.
+    """
+    global next_card_id
+    deck = flashcards
+    try:
+        file = open(lazy_index_path(filename), "rb")
+    except FileNotFoundError:
+        return False
+    try:
+        header = json.loads(file.readline())
+        stat = os.stat(deck.path)
+        if (
+            header["inode"] != stat.st_ino
+            or header["size"] > stat.st_size
+            or "next_id" not in header  # Saved before cards had ids
+            or not header.get("terms")  # Saved before it held the terms
+        ):
+            file.close()
+            return False
+        deck.offsets.frombytes(file.read(8 * header["count"]))
+        deck.ids.frombytes(file.read(8 * header["count"]))
+        deck.terms.frombytes(file.read(8 * header["count"]))
+        category_index.clear()
+        for category, count in header["categories"]:
+            positions = array("I")
+            positions.frombytes(file.read(4 * count))
+            category_index[category] = positions
+        count_bytes("read", file.tell())
+        if header.get("words"):
+            offset = file.tell()
+            file.seek(offset + header["words"])
+            changes = marshal.loads(file.read())
+            deck.saved_words = (file, offset, header["words"], changes)
+        else:
+            file.close()
+    except (json.JSONDecodeError, KeyError, ValueError, EOFError):
+        file.close()
+        deck.offsets, deck.ids, deck.terms = (
+            array("Q"), array("Q"), array("Q")
+        )
+        return False
+    deck.size = header["size"]
+    deck.records = header["records"]
+    next_card_id = header["next_id"]
+    return True
 
 
-def initialize_progress_file():
+def save_lazy_index(filename=deck_file):
     """
-    Initializes the progress tracking file. Creates an empty list-based JSON
-    file if it does not exist, or if existing data is not in list format.
-    Ensures valid progress tracking data structure.
+    Saves the lazy deck's offsets, card ids, term hashes and category
+    index so the next start does not need to scan the whole file. The
+    search index is saved too, if it was built or loaded with a saved
+    one: an unread saved index is copied as it is, together with the
+    changes still to be applied to it.
     """
-    if not os.path.exists(progress_file):
-        with open(progress_file, "w") as file:
-            json.dump([], file)
-    else:
-        try:
-            with open(progress_file, "r") as file:
-                data = json.load(file)
-            if not isinstance(data, list):  # Reset if data is not a list
-                raise ValueError("Progress data is not a list.")
-        except (json.JSONDecodeError, ValueError):
-            with open(progress_file, "w") as file:
-                json.dump([], file)
-            print(
-                "Progress file initialized as an empty list due to "
-                "invalid data."
-            )
+    deck = flashcards
+    words = changes = None
+    if search_index is not None:
+        words = marshal.dumps(
+            {word: ids.tobytes() for word, ids in search_index.items()}
+        )
+        changes = []
+    elif deck.saved_words is not None:
+        file, offset, size, changes = deck.saved_words
+        file.seek(offset)
+        words = file.read(size)
+        changes = changes + deck.word_changes
+    header = {
+        "inode": os.stat(deck.path).st_ino,
+        "size": deck.size,
+        "records": deck.records,
+        "count": len(deck.offsets),
+        "next_id": next_card_id,
+        "terms": True,
+        "categories": [
+            [category, len(positions)]
+            for category, positions in category_index.items()
+        ],
+        "words": words and len(words),
+    }
+    # Readers save the index too, so each process uses its own temp file
+    temp_path = f"{lazy_index_path(filename)}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(json.dumps(header).encode() + b"\n")
+        file.write(deck.offsets.tobytes())
+        file.write(deck.ids.tobytes())
+        file.write(deck.terms.tobytes())
+        for positions in category_index.values():
+            file.write(array("I", positions).tobytes())
+        if words:
+            file.write(words)
+            file.write(marshal.dumps(changes))
+    os.replace(temp_path, lazy_index_path(filename))
 
 
-def load_flashcards(filename="flashcards.json"):
+def compact_lazy_deck(filename=deck_file):
     """
-    Loads flashcards from the specified JSON file. If the file is missing,
-    starts with an empty flashcard list. If data is corrupted, initializes
-    with an empty list and displays an error message.
+    Rewrites the lazy deck with only its current cards, dropping
+    superseded lines, and saves a fresh side index.
     """
-    global flashcards
+    deck = flashcards
     try:
-        with open(filename, "r") as file:
-            flashcards = json.load(file)
-        print("\nQuiz Cards loaded successfully.")
-    except FileNotFoundError:
-        print("\nNo saved Quiz Cards found. Starting with an empty list.")
-    except json.JSONDecodeError:
-        print_error("\nCorrupted file. Starting with an empty list.")
-        flashcards = []
+        deck.offsets, deck.ids, deck.terms = write_lazy_deck(deck.path, deck)
+    except IOError:
+        print_error("\nUnable to compact the Quiz Card deck.")
+        return
+    deck.records = len(deck.offsets)
+    deck.size = os.path.getsize(deck.path)
+    deck.remap()
+    save_lazy_index(filename)
+
+
+# --- SQLite Storage Functions ---
+
+
+def connect_database(filename=deck_file):
+    """
+    Opens the SQLite database on first use and returns the connection.
+    Creates the cards and progress tables with their category and date
+    indexes, and copies in any existing JSON flashcards and progress the
+    first time the database is created, holding the deck's file lock so
+    processes starting together migrate only once.
+    """
+    global database
+    if database is not None:
+        return database
+    # Sessions sharing one process use the connection from their own threads
+    database = sqlite3.connect(database_file, check_same_thread=False)
+    with database:
+        database.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY,
+                term TEXT NOT NULL,
+                definition TEXT NOT NULL,
+                category TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cards_category ON cards (category);
+            CREATE TABLE IF NOT EXISTS progress (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                total_questions INTEGER NOT NULL,
+                success_rate REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS progress_date ON progress (date);
+            """
+        )
+    # Under the file lock, so only the first process to start migrates
+    with storage_lock, file_lock(filename):
+        if database.execute("PRAGMA user_version").fetchone()[0] == 0:
+            migrate_to_database(filename)
+    return database
 
 
-def save_flashcards(filename="flashcards.json"):
+def migrate_to_database(filename=deck_file):
     """
-    Saves all flashcards.
+    Copies the JSON flashcards (including any journal) and the progress
+    history into a newly created database, then marks it as migrated.
     """
+    global storage_mode
+    storage_mode = "json"  # Read the existing files the usual way
     try:
-        with open(filename, "w") as file:
-            json.dump(flashcards, file, indent=4)
-        print("\nQuiz Cards saved successfully.")
-    except IOError:
+        load_flashcards(filename)
+        initialize_progress_file()
+        entries = list(read_progress())
+    finally:
+        storage_mode = "sqlite"
+    with database:
+        insert_database_cards(flashcards)
+        database.executemany(
+            "INSERT INTO progress (date, category, score, total_questions, "
+            "success_rate) VALUES (:date, :category, :score, "
+            ":total_questions, :success_rate)",
+            entries,
+        )
+        database.execute("PRAGMA user_version = 1")
+
+
+def load_database_flashcards():
+    """
+    Returns all flashcards from the cards table in the order they were
+    added.
+    """
+    return [
+        Flashcard(term, definition, category, card_id)
+        for card_id, term, definition, category in database.execute(
+            "SELECT id, term, definition, category FROM cards ORDER BY id"
+        )
+    ]
+
+
+def insert_database_cards(cards):
+    """
+    Inserts many flashcards, keeping their ids, with one statement. The
+    caller commits.
+    """
+    database.executemany(
+        "INSERT INTO cards (id, term, definition, category) "
+        "VALUES (?, ?, ?, ?)",
+        (
+            (fc.card_id, fc.term, fc.definition, card_category(fc))
+            for fc in cards
+        ),
+    )
+
+
+def record_database_change(op, flashcard):
+    """
+    Writes a single add, edit or delete to the cards table.
+    """
+    record_database_changes([(op, flashcard)])
+
+
+def record_database_changes(changes):
+    """
+    Writes a list of (op, flashcard) adds, edits and deletes to the cards
+    table in one transaction.
+    """
+    try:
+        with connect_database():
+            for op, flashcard in changes:
+                execute_database_change(op, flashcard)
+        emit("\nQuiz Cards saved successfully.")
+    except sqlite3.Error:
         print_error("\nUnable to save Quiz Cards.")
 
 
+def execute_database_change(op, flashcard):
+    """
+    Executes the statement for one add, edit or delete. The caller
+    commits.
+    """
+    if op == "add":
+        cursor = database.execute(
+            "INSERT INTO cards (id, term, definition, category) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                flashcard.card_id,
+                flashcard.term,
+                flashcard.definition,
+                flashcard.category,
+            ),
+        )
+        flashcard.card_id = cursor.lastrowid
+    elif op == "edit":
+        database.execute(
+            "UPDATE cards SET term = ?, definition = ?, category = ? "
+            "WHERE id = ?",
+            (
+                flashcard.term,
+                flashcard.definition,
+                flashcard.category,
+                flashcard.card_id,
+            ),
+        )
+    elif op == "delete":
+        database.execute(
+            "DELETE FROM cards WHERE id = ?", (flashcard.card_id,)
+        )
+
+
+def get_database_category_ids(category):
+    """
+    Returns the ids of the flashcards stored under a category using the
+    category index of the cards table.
+    """
+    return array(
+        "Q",
+        (
+            card_id
+            for card_id, in connect_database().execute(
+                "SELECT id FROM cards WHERE category = ? ORDER BY id",
+                (category,),
+            )
+        ),
+    )
+
+
+def read_database_progress_range(start, end, category):
+    """
+    Yields the progress entries dated from start up to, but not
+    including, end, found with the index on the progress table's date,
+    optionally only those in category.
+    """
+    conditions, parameters = [], []
+    if start is not None:
+        conditions.append("date >= ?")
+        parameters.append(start.strftime(PROGRESS_DATE_FORMAT))
+    if end is not None:
+        conditions.append("date < ?")
+        parameters.append(end.strftime(PROGRESS_DATE_FORMAT))
+    if category is not None:
+        conditions.append("category = ?")
+        parameters.append(category)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    cursor = connect_database().execute(
+        "SELECT date, category, score, total_questions, success_rate "
+        f"FROM progress{where} ORDER BY date, id",
+        parameters,
+    )
+    for date, category, score, total_questions, success_rate in cursor:
+        yield {
+            "date": date,
+            "category": category,
+            "score": score,
+            "total_questions": total_questions,
+            "success_rate": success_rate,
+        }
+
+
+def read_database_progress():
+    """
+    Yields progress entries from the progress table in the order they were
+    saved.
+    """
+    cursor = connect_database().execute(
+        "SELECT date, category, score, total_questions, success_rate "
+        "FROM progress ORDER BY id"
+    )
+    for date, category, score, total_questions, success_rate in cursor:
+        yield {
+            "date": date,
+            "category": category,
+            "score": score,
+            "total_questions": total_questions,
+            "success_rate": success_rate,
+        }
+
+
 def display_welcome_message():
     """
     Displays a welcome message and provides an overview of the program's
     features, guiding the user through Quiz Cards functionality.
     """
-    print("*****************************************")
-    print("        Welcome to Quiz Cards!")
-    print("*****************************************")
-    print()
-    print(
+    emit("*****************************************")
+    emit("        Welcome to Quiz Cards!")
+    emit("*****************************************")
+    emit()
+    emit(
         "Boost your knowledge with Quiz Cards - "
         "your personal flashcard quiz tool!"
     )
-    print()
-    print("What you can do with Quiz Cards:")
-    print("\n1. Add your own Quiz Cards for a custom learning experience.")
-    print(
+    emit()
+    emit("What you can do with Quiz Cards:")
+    emit("\n1. Add your own Quiz Cards for a custom learning experience.")
+    emit(
         "2. View and manage all Quiz Cards" "to reinforce what you've learned."
     )
-    print("3. Sort Quiz Cards into categories to keep everything organized.")
-    print("4. Delete Quiz Cards you no longer need to stay focused.")
-    print(
+    emit("3. Sort Quiz Cards into categories to keep everything organized.")
+    emit("4. Delete Quiz Cards you no longer need to stay focused.")
+    emit(
         "5. Test yourself with the Quiz Mode and "
         "track your progress over time."
     )
-    print()
-    print(
+    emit()
+    emit(
         "Let’s get started and make your "
         "learning journey interactive and fun!"
     )
@@ -98,6 +2438,7 @@ def display_welcome_message():
 # --- Flashcard Management Functions ---
 
 
+@instrumented("add_flashcard")
 def add_flashcard():
     """
     Prompts the user to input a term, definition, and optional category to
@@ -107,50 +2448,57 @@ def add_flashcard():
     successful addition.
     """
     print_section_title("Add a New Quiz Card")
-    print(
+    emit(
         "You’ll be asked to enter a term/question followed by its "
         "definition/answer, and an optional category."
     )
-    print(
+    emit(
         "\nExample:\n \nTerm = Python"
         "\nDefinition = A high-level programming language"
         "\nCategory = Programming"
     )
 
-    term = input(
+    term = read_input(
         "\nEnter the term/question:\n"
     ).strip()
 
-    definition = input(
+    definition = read_input(
         "Enter the definition/answer:\n"
     ).strip()
 
-    category = input(
+    category = read_input(
         "Enter the category (or press Enter to skip):\n"
     ).strip().title()
 
     if term and definition:  # Validation for term and definition
-        print(
+        with storage_lock:
+            duplicate = has_term(term)
+        if duplicate:
+            emit(f"\nA Quiz Card with the term '{term}' already exists.")
+            message = "\nDo you want to add it anyway? (yes/no): "
+            if not confirm_action(message):
+                emit("\nQuiz Card not added.")
+                return
+        emit(
             f"\nYou entered:\nTerm: {term}\nDefinition: {definition}\n"
             f"Category: {category or 'Uncategorized'}"
         )
         if confirm_action("\nDo you want to add this Quiz Card? (yes/no): "):
-            flashcards.append(
-                {
-                    "term": term,
-                    "definition": definition,
-                    "category": category if category else "Uncategorized",
-                }
-            )
-            print("\nQuiz Card added successfully!")
-            save_flashcards()  # Auto-save enabled
+            insert_flashcard(
+                Flashcard(
+                    term,
+                    definition,
+                    category if category else "Uncategorized",
+                )
+            )  # Auto-save enabled
         else:
-            print("\nQuiz Card not added.")
+            emit("\nQuiz Card not added.")
     else:
         print_error("\nBoth term and definition are required.")
-        print("\nReturning to Previous Menu...")
+        emit("\nReturning to Previous Menu...")
 
 
+@instrumented("view_flashcards")
 def view_flashcards():
     """
     View flashcards by category or view all flashcards.
@@ -158,23 +2506,18 @@ def view_flashcards():
     """
     print_section_title("View Quiz Cards")
     if not flashcards:
-        print("No Quiz Cards available.")
-        print("\nReturning to Previous Menu...")
+        emit("No Quiz Cards available.")
+        emit("\nReturning to Previous Menu...")
         return  # Exit if there are no flashcards to view
 
     while True:
         # Display user options
-        unique_categories = sorted(
-            set(
-                fc["category"] if fc["category"] else "Uncategorized"
-                for fc in flashcards
-            )
-        )
-        print("Available Categories:\n")
+        unique_categories = get_categories()
+        emit("Available Categories:\n")
         for idx, category in enumerate(unique_categories, start=1):
-            print(f"{idx}. {category}")
-        print(f"{len(unique_categories) + 1}. View All Quiz Cards")
-        print(f"{len(unique_categories) + 2}. Return to Quiz Card Management")
+            emit(f"{idx}. {category}")
+        emit(f"{len(unique_categories) + 1}. View All Quiz Cards")
+        emit(f"{len(unique_categories) + 2}. Return to Quiz Card Management")
 
         # Prompt user to select a category or view all flashcards
         try:
@@ -186,44 +2529,37 @@ def view_flashcards():
             )
             if selection == len(unique_categories) + 2:
                 # User chose to return to the previous menu
-                print("\nReturning to Previous Menu...")
+                emit("\nReturning to Previous Menu...")
                 return
             elif 1 <= selection <= len(unique_categories):
                 # Selected a specific category
                 selected_category = unique_categories[selection - 1]
-                category_flashcards = [
-                    fc
-                    for fc in flashcards
-                    if (fc["category"] if fc["category"] else "Uncategorized")
-                    == selected_category
-                ]
-                print(f"\nQuiz Cards in category '{selected_category}':")
+                category_flashcards = get_category_flashcards(
+                    selected_category
+                )
+                emit(f"\nQuiz Cards in category '{selected_category}':")
             else:
                 # View all flashcards
-                category_flashcards = flashcards
-                print("\nAll Quiz Cards:")
+                category_flashcards = all_flashcards()
+                emit("\nAll Quiz Cards:")
 
             # Display the selected flashcards
             if not category_flashcards:
-                print("\nNo Quiz Cards found in this category.")
+                emit("\nNo Quiz Cards found in this category.")
             else:
-                for index, flashcard in enumerate(
-                    category_flashcards, start=1
-                ):
-                    category = (
-                        flashcard["category"]
-                        if flashcard["category"]
-                        else "Uncategorized"
-                    )
-                    print(
-                        f"\n{index}. Term: {flashcard['term']}  "
-                        f"\nDefinition: {flashcard['definition']}  "
-                        f"\nCategory: {category}"
+                emit_paged(
+                    f"\n{index}. Term: {flashcard['term']}  "
+                    f"\nDefinition: {flashcard['definition']}  "
+                    f"\nCategory: {card_category(flashcard)}"
+                    for index, flashcard in enumerate(
+                        category_flashcards, start=1
                     )
+                    if flashcard is not None  # Deleted in another session
+                )
 
             # Prompt user to view other flashcards or return to main menu
             while True:
-                continue_choice = input(
+                continue_choice = read_input(
                     "\nWould you like to view other flashcards? "
                     "(yes to continue, no to return):\n"
                 ).strip().lower()
@@ -241,9 +2577,10 @@ def view_flashcards():
         except ValueError:
             print_error("Please enter a valid number.")
 
-    print("\nReturning to Previous Menu...")
+    emit("\nReturning to Previous Menu...")
 
 
+@instrumented("edit_flashcard")
 def edit_flashcard():
     """
     Edits an existing flashcard. Displays all flashcards with index numbers,
@@ -253,20 +2590,24 @@ def edit_flashcard():
     """
     print_section_title("Edit a Quiz Card")
     if not flashcards:
-        print("No Quiz Cards available to edit.")
-        print("\nReturning to Previous Menu...")
+        emit("No Quiz Cards available to edit.")
+        emit("\nReturning to Previous Menu...")
         return
 
-    display_flashcards()  # Display flashcards without navigation options
-
-    # Get a valid flashcard index from the user
-    index = get_valid_index(
-        "\nEnter the number of the Quiz Card you want to edit: ",
-        len(flashcards) - 1,
+    # Find the flashcard by searching, or by its number in a list
+    card_id = choose_flashcard(
+        "\nEnter the number of the Quiz Card you want to edit: "
     )
-    flashcard = flashcards[index]
+    if card_id is None:
+        emit("\nReturning to Previous Menu...")
+        return
+    with storage_lock:
+        flashcard = find_card(card_id)
+    if flashcard is None:
+        print_error("\nThis Quiz Card was deleted in another session.")
+        return
 
-    print(
+    emit(
         f"\nSelected Quiz Card:\n \nTerm = '{flashcard['term']}', "
         f"\nDefinition = '{flashcard['definition']}', "
         f"\nCategory = '{flashcard['category'] or 'Uncategorized'}'"
@@ -274,42 +2615,52 @@ def edit_flashcard():
     # Ask for confirmation before allowing edits
     message = "\nDo you want to edit this Quiz Card? (yes/no):\n "
     if not confirm_action(message):
-        print("\nEdit cancelled.")
-        print("\nReturning to Previous Menu...")
+        emit("\nEdit cancelled.")
+        emit("\nReturning to Previous Menu...")
         return
 
-    new_term = input(
+    new_term = read_input(
         "Enter new term (or press Enter to keep current term):\n"
     ).strip() or flashcard["term"]
 
-    new_definition = input(
+    new_definition = read_input(
         "Enter new definition (or press Enter to keep current definition):\n"
     ).strip() or flashcard["definition"]
 
-    new_category = input(
+    new_category = read_input(
         "Enter new category (or press Enter to keep current category):\n"
     ).strip().title() or flashcard["category"]
 
     # Display changes and ask for final confirmation
-    print(
+    emit(
         f"\nUpdated Quiz Card:\nTerm: {new_term}\n"
         f"Definition: {new_definition}\n"
         f"Category: {new_category or 'Uncategorized'}"
     )
     if confirm_action("\nDo you want to save these changes? (yes/no):\n "):
-        flashcard.update(
-            {
-                "term": new_term,
-                "definition": new_definition,
-                "category": new_category if new_category else "Uncategorized",
-            }
-        )
-        print("\nQuiz Card updated successfully!")
-        save_flashcards()  # Auto-save enabled
+        with storage_transaction():
+            index = card_position(flashcard.card_id)
+            if index is None:
+                print_error("\nThis Quiz Card was deleted in another session.")
+                return
+            flashcard = flashcards[index]
+            unindex_card(index)
+            flashcard.update(
+                {
+                    "term": new_term,
+                    "definition": new_definition,
+                    "category": new_category or "Uncategorized",
+                }
+            )
+            flashcards[index] = flashcard  # A lazy deck stores the new card
+            index_card(index)
+            emit("\nQuiz Card updated successfully!")
+            record_change("edit", index, flashcard)  # Auto-save enabled
     else:
-        print("\nChanges not saved.")
+        emit("\nChanges not saved.")
 
 
+@instrumented("delete_flashcard")
 def delete_flashcard():
     """
     Allows users to delete flashcards.
@@ -318,20 +2669,24 @@ def delete_flashcard():
     """
     print_section_title("Delete a Quiz Card")
     if not flashcards:
-        print("No Quiz Cards to delete.")
-        print("\nReturning to Previous Menu...")
+        emit("No Quiz Cards to delete.")
+        emit("\nReturning to Previous Menu...")
         return
 
-    # Display current flashcards without prompts
-    display_flashcards()
-
-    # Get a valid flashcard index from the user
-    index = get_valid_index(
-        "\nEnter the number of the Quiz Card to delete: ", len(flashcards) - 1
+    # Find the flashcard by searching, or by its number in a list
+    card_id = choose_flashcard(
+        "\nEnter the number of the Quiz Card to delete: "
     )
-    flashcard = flashcards[index]
+    if card_id is None:
+        emit("\nReturning to Previous Menu...")
+        return
+    with storage_lock:
+        flashcard = find_card(card_id)
+    if flashcard is None:
+        print_error("\nThis Quiz Card was deleted in another session.")
+        return
 
-    print(
+    emit(
         f"\nSelected Quiz Card:\n \nTerm: {flashcard['term']}\n"
         f"Definition: {flashcard['definition']}\n"
         f"Category: {flashcard['category'] or 'Uncategorized'}"
@@ -341,19 +2696,147 @@ def delete_flashcard():
     if confirm_action(
         "\nAre you sure you want to delete this flashcard? (yes/no):\n"
     ):
+        remove_flashcard(flashcard.card_id)  # Auto-save enabled
+    else:
+        emit("\nQuiz Card not deleted.")
+
+
+def insert_flashcard(flashcard):
+    """
+    Gives a new flashcard an id, adds it to the deck and its indexes and
+    saves it, as one storage transaction.
+    """
+    with storage_transaction():
+        flashcard.card_id = new_card_id()
+        flashcards.append(flashcard)
+        index_card(len(flashcards) - 1)
+        emit("\nQuiz Card added successfully!")
+        record_change("add", len(flashcards) - 1, flashcard)
+
+
+def remove_flashcard(card_id):
+    """
+    Deletes the flashcard with the given id from the deck and its indexes
+    and saves the change, as one storage transaction.
+    """
+    with storage_transaction():
+        index = card_position(card_id)
+        if index is None:
+            print_error("\nThis Quiz Card was deleted in another session.")
+            return
+        flashcard = flashcards[index]
+        unindex_card(index)
+        shift_category_index(index)
         del flashcards[index]
-        print("\nQuiz Card deleted successfully.")
-        save_flashcards()  # Auto-save enabled
+        emit("\nQuiz Card deleted successfully.")
+        record_change("delete", index, flashcard)
+
+
+@instrumented("find_flashcards")
+def find_flashcards():
+    """
+    Searches the terms and definitions of all flashcards and lists the
+    matches.
+    """
+    print_section_title("Search Quiz Cards")
+    query = read_input("Enter words to search for:\n").strip()
+    show_search_results(query)
+    emit("\nReturning to Previous Menu...")
+
+
+def show_search_results(query):
+    """
+    Lists the flashcards matching a search, numbered from 1, and returns
+    them as a DeckView.
+    """
+    with storage_lock:
+        matches = DeckView(search_flashcards(query))
+    if not matches:
+        emit(f"\nNo Quiz Cards match '{query}'.")
+        return matches
+    emit(f"\nQuiz Cards matching '{query}':")
+    emit_paged(
+        f"\n{index}. Term: {flashcard['term']} "
+        f"\nDefinition: {flashcard['definition']} "
+        f"\nCategory: {card_category(flashcard)}"
+        for index, flashcard in enumerate(matches, start=1)
+        if flashcard is not None  # Deleted in another session
+    )
+    return matches
+
+
+def choose_flashcard(prompt):
+    """
+    Asks the user to pick a flashcard, either from the results of a search
+    or, if no search is entered, by its number in a list. Returns the
+    flashcard's id, or None if nothing was listed.
+    """
+    query = read_input(
+        "Enter words to search for "
+        "(or press Enter to choose from a list):\n"
+    ).strip()
+    if not query:
+        # Display flashcards without navigation options
+        listed = display_flashcards()
+    else:
+        listed = show_search_results(query)
+    if not listed:
+        return None
+    return listed.ids[get_valid_index(prompt, len(listed) - 1)]
+
+
+@instrumented("batch_change_flashcards")
+def batch_change_flashcards():
+    """
+    Deletes or recategorises a set of flashcards, chosen by category or
+    by search, as one transaction. Shows how many cards were selected and
+    asks for confirmation before anything is changed.
+    """
+    print_section_title("Batch Changes")
+    if not flashcards:
+        emit("No Quiz Cards available to change.")
+        emit("\nReturning to Previous Menu...")
+        return
+
+    emit("Select Quiz Cards by:\n")
+    emit("1. Category")
+    emit("2. Search")
+    if get_valid_integer("\nChoose an option (1-2):", 1, 2) == 1:
+        category = choose_category()
+        selected = get_category_flashcards(category)
+        if not selected:
+            emit(f"\nNo Quiz Cards found in category '{category}'.")
     else:
-        print("\nQuiz Card not deleted.")
+        query = read_input("Enter words to search for:\n").strip()
+        selected = show_search_results(query)
+    if not selected:
+        emit("\nReturning to Previous Menu...")
+        return
+
+    emit(f"\n{len(selected)} Quiz Cards selected.")
+    emit("\n1. Delete them")
+    emit("2. Move them to another category")
+    emit("3. Cancel")
+    action = get_valid_integer("\nChoose an option (1-3):", 1, 3)
+    new_category = None
+    if action == 2:
+        new_category = read_input(
+            "Enter the new category:\n"
+        ).strip().title() or "Uncategorized"
+    if action == 3 or not confirm_action(
+        f"\nApply this change to {len(selected)} Quiz Cards? (yes/no): "
+    ):
+        emit("\nNo Quiz Cards were changed.")
+        return
+    apply_batch(selected.ids, new_category)
+    emit(f"\n{len(selected)} Quiz Cards changed.")
 
 
 def list_categories():
     """
     Allows users to view all categories.
     """
-    categories = set(fc["category"] for fc in flashcards if fc["category"])
-    print("Available categories:", ", ".join(categories))
+    emit("Available categories:", ", ".join(get_categories()))
 
 
 def choose_category():
@@ -362,19 +2845,93 @@ def choose_category():
     """
     list_categories()
     prompt = "Enter a category (or press Enter to skip):\n"
-    return input(prompt).strip().title()
+    return read_input(prompt).strip().title()
 
 
 # --- Helper & Validation Functions ---
 
 
+def emit(*values, sep=" ", end="\n"):
+    """
+    Adds text to the screen buffer, taking the same arguments as print.
+    The buffer is written in one go when the next prompt is shown.
+    """
+    screen_buffer().append(sep.join(str(value) for value in values) + end)
+
+
+def screen_buffer():
+    """
+    Returns the current session's screen buffer, the output waiting to be
+    written with the next prompt.
+    """
+    try:
+        return terminal.buffer
+    except AttributeError:
+        terminal.buffer = []
+        return terminal.buffer
+
+
+@instrumented("render")
+def flush_screen():
+    """
+    Writes everything in the screen buffer with a single write and flush,
+    to the session's output stream if it has one, otherwise to stdout.
+    """
+    buffer = screen_buffer()
+    if buffer:
+        output = getattr(terminal, "output", None) or sys.stdout
+        text = "".join(buffer)
+        output.write(text)
+        output.flush()
+        buffer.clear()
+        count_bytes("written", len(text))
+
+
+def read_input(prompt=""):
+    """
+    Shows the buffered screen together with the prompt, then reads a line
+    of input like the built-in input, from the session's input stream if
+    it has one.
+    """
+    screen_buffer().append(prompt)
+    flush_screen()
+    stream = getattr(terminal, "input", None)
+    waiting = time.perf_counter()
+    try:
+        if stream is None:
+            return input()
+        line = stream.readline()
+    finally:
+        count_waiting(time.perf_counter() - waiting)
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
+
+def emit_paged(blocks, page_size=PAGE_SIZE):
+    """
+    Emits blocks of text a page at a time, asking before each further page.
+    Blocks are only produced as they are shown, so stopping early skips
+    the work of formatting (or loading) the rest.
+    """
+    for count, block in enumerate(blocks):
+        if count and count % page_size == 0:
+            choice = read_input(
+                f"\nShowing {count}. Press Enter for more, "
+                "or type 'q' to stop:\n"
+            ).strip().lower()
+            if choice == "q":
+                return
+        emit(block)
+
+
 def print_section_title(title):
     """
     Prints a formatted section title to indicate the start of a new option.
     """
-    print("\n" + "*" * 40)
-    print(f"{title.center(40)}")
-    print("*" * 40 + "\n")
+    emit("\n" + "*" * 40)
+    emit(f"{title.center(40)}")
+    emit("*" * 40 + "\n")
 
 
 def confirm_action(message="Are you sure you want to proceed? (yes/no): \n"):
@@ -384,7 +2941,7 @@ def confirm_action(message="Are you sure you want to proceed? (yes/no): \n"):
     for 'no' responses, used for potentially irreversible actions.
     """
     while True:
-        choice = input(message + "\n").strip().lower()
+        choice = read_input(message + "\n").strip().lower()
         if choice == "yes":
             return True
         elif choice == "no":
@@ -394,7 +2951,7 @@ def confirm_action(message="Are you sure you want to proceed? (yes/no): \n"):
 
 
 def print_error(message):
-    print(f"\n**ERROR**: {message}")
+    emit(f"\n**ERROR**: {message}")
 
 
 def get_valid_index(prompt, max_index):
@@ -404,7 +2961,7 @@ def get_valid_index(prompt, max_index):
     """
     while True:
         try:
-            index = int(input(prompt + "\n")) - 1
+            index = int(read_input(prompt + "\n")) - 1
             if 0 <= index <= max_index:
                 return index
             else:
@@ -423,7 +2980,7 @@ def get_valid_integer(prompt, min_value, max_value):
     """
     while True:
         try:
-            value = int(input(prompt + "\n"))
+            value = int(read_input(prompt + "\n"))
             if min_value <= value <= max_value:
                 return value
             else:
@@ -435,26 +2992,34 @@ def get_valid_integer(prompt, min_value, max_value):
             print_error("\nInvalid input. Please enter a valid number.")
 
 
+def get_valid_date(prompt):
+    """
+    Prompts the user to enter a date as YYYY-MM-DD, re-prompting for
+    invalid input, and returns it as a datetime at midnight.
+    """
+    while True:
+        try:
+            text = read_input(prompt + "\n").strip()
+            return datetime.strptime(text, "%Y-%m-%d")
+        except ValueError:
+            print_error("\nInvalid date. Please use the form YYYY-MM-DD.")
+
+
 def display_flashcards():
     """
     Displays flashcards by category or all flashcards,
-    without prompting for navigation.
+    without prompting for navigation, and returns the DeckView listed.
     Used as a helper function in other parts of the program.
     """
     if not flashcards:
-        print("No Quiz Cards available.")
-        return
+        emit("No Quiz Cards available.")
+        return None
 
-    unique_categories = sorted(
-        set(
-            fc["category"] if fc["category"] else "Uncategorized"
-            for fc in flashcards
-        )
-    )
-    print("Available Categories:\n")
+    unique_categories = get_categories()
+    emit("Available Categories:\n")
     for idx, category in enumerate(unique_categories, start=1):
-        print(f"{idx}. {category}")
-    print(f"{len(unique_categories) + 1}. View All Quiz Cards")
+        emit(f"{idx}. {category}")
+    emit(f"{len(unique_categories) + 1}. View All Quiz Cards")
 
     # Prompt user to select a category or view all flashcards
     try:
@@ -465,38 +3030,474 @@ def display_flashcards():
         )
         if 1 <= selection <= len(unique_categories):
             selected_category = unique_categories[selection - 1]
-            category_flashcards = [
-                fc
-                for fc in flashcards
-                if (fc["category"] if fc["category"] else "Uncategorized")
-                == selected_category
-            ]
-            print(f"\nQuiz Cards in category '{selected_category}':")
+            category_flashcards = get_category_flashcards(selected_category)
+            emit(f"\nQuiz Cards in category '{selected_category}':")
         else:
-            category_flashcards = flashcards
-            print("\nAll Quiz Cards:")
+            category_flashcards = all_flashcards()
+            emit("\nAll Quiz Cards:")
 
         if not category_flashcards:
-            print("\nNo Quiz Cards found in this category.")
+            emit("\nNo Quiz Cards found in this category.")
         else:
-            for index, flashcard in enumerate(category_flashcards, start=1):
-                category = (
-                    flashcard["category"]
-                    if flashcard["category"]
-                    else "Uncategorized"
-                )
-                print(
-                    f"\n{index}. Term: {flashcard['term']} "
-                    f"\nDefinition: {flashcard['definition']} "
-                    f"\nCategory: {category}"
-                )
+            emit_paged(
+                f"\n{index}. Term: {flashcard['term']} "
+                f"\nDefinition: {flashcard['definition']} "
+                f"\nCategory: {card_category(flashcard)}"
+                for index, flashcard in enumerate(category_flashcards, start=1)
+                if flashcard is not None  # Deleted in another session
+            )
+        return category_flashcards
     except ValueError:
         print_error("\nPlease enter a valid number.")
+        return None
+
+
+# --- Question Sampler ---
+
+
+class WeightedSampler:
+    """
+    Picks positions 0 to size - 1 at random in proportion to their weights.
+    The weights are kept in a Fenwick tree, so picking a position and
+    changing a weight both take O(log n) however large the deck is. All
+    positions start with the same weight unless a list of weights is
+    given; either way the tree is built in O(n).
+    """
+
+    def __init__(self, size, weight=1.0, weights=None):
+        self.size = size
+        self.top = 1 << (size.bit_length() - 1) if size else 0
+        self.history = {}  # Card id -> [attempts, misses]
+        if weights is None:
+            self.weights = array("d", [weight]) * size
+            # With equal weights node i covers (i & -i) positions
+            self.tree = array("d", [0.0])
+            self.tree.extend([(i & -i) * weight for i in range(1, size + 1)])
+            self.positive = size if weight > 0 else 0  # Can come up
+            return
+        self.weights = array("d", weights)
+        self.tree = array("d", [0.0])
+        self.tree.extend(self.weights)
+        for i in range(1, size + 1):  # Each node adds itself to its parent
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+        self.positive = sum(weight > 0 for weight in self.weights)
+
+    def total(self):
+        """
+        Returns the sum of all weights.
+        """
+        total = 0.0
+        i = self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def update(self, position, weight):
+        """
+        Sets the weight of one position.
+        """
+        old = self.weights[position]
+        self.positive += (weight > 0) - (old > 0)
+        delta = weight - old
+        self.weights[position] = weight
+        i = position + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def sample(self):
+        """
+        Returns a random position, chosen in proportion to its weight.
+        """
+        while True:
+            target = random.random() * self.total()
+            position = 0
+            step = self.top
+            while step:
+                if (
+                    position + step <= self.size
+                    and self.tree[position + step] <= target
+                ):
+                    position += step
+                    target -= self.tree[position]
+                step >>= 1
+            if position < self.size and self.weights[position] > 0:
+                return position  # Otherwise a rounding error, try again
+
+    def weight(self, card_id):
+        """
+        Returns a card's weight: its smoothed error rate, so cards that
+        are often missed come up more often. A card never asked weighs 1.
+        """
+        return error_weight(*self.history.get(card_id, (0, 0)))
+
+    def record_answer(self, card_id, correct):
+        """
+        Records an answer and returns the card's new weight.
+        """
+        attempts, misses = self.history.get(card_id, (0, 0))
+        self.history[card_id] = [attempts + 1, misses + (not correct)]
+        return self.weight(card_id)
+
+
+def error_weight(attempts, misses):
+    """
+    Returns a card's smoothed error rate, its weight in a quiz.
+    """
+    return 2 * (misses + 1) / (attempts + 2)
+
+
+def quiz_sampler(cards):
+    """
+    Returns a WeightedSampler over a DeckView, with each card's history
+    and weight taken from its card statistics, so cards missed in earlier
+    sessions come up more often from the first question. Only copying
+    the statistics is done under storage_lock.
+    """
+    with storage_lock:
+        stats = get_card_statistics()
+        stats.remap()  # Take in answers recorded by other sessions
+        records = stats.records()
+        if records:
+            fields = stats.fields
+            attempts = fields[0::CARD_STATS_FIELDS].tolist()
+            correct = fields[1::CARD_STATS_FIELDS].tolist()
+    if not records:
+        return WeightedSampler(len(cards))  # No card was ever asked
+    history = {}
+    weights = array("d", [1.0]) * len(cards)  # The weight of no answers
+    for position, card_id in enumerate(cards.ids):
+        if card_id < records and attempts[card_id]:
+            misses = attempts[card_id] - correct[card_id]
+            history[card_id] = [attempts[card_id], misses]
+            weights[position] = error_weight(attempts[card_id], misses)
+    sampler = WeightedSampler(len(cards), weights=weights)
+    sampler.history = history
+    return sampler
+
+
+# --- Spaced Repetition ---
+
+
+class ReviewSchedule:
+    """
+    When each reviewed flashcard is next due, kept in a heap of
+    (due, card_id) pairs so the card due soonest is found, and a card
+    rescheduled, in O(log n) however large the deck is. Rescheduling
+    pushes a new pair and leaves the old one behind; stale pairs are
+    dropped when they reach the top of the heap. Each change is appended
+    to the schedule file as one line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cards = {}  # Card id -> [due, interval in days, ease]
+        self.heap = []
+        self.records = 0  # Lines in the file, including superseded ones
+        self.newest_id = 0  # Cards with higher ids were never reviewed
+        self.inode = None  # File the schedule was read from
+        self.size = 0  # Bytes of that file read so far
+
+    def catch_up(self):
+        """
+        Reads the lines appended to the schedule file since it was last
+        read, by this or another process, ignoring lines that cannot be
+        parsed. Rereads the whole file the first time and after another
+        process has compacted it, then builds the heap in one pass.
+        """
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            reread = stat.st_ino != self.inode or stat.st_size < self.size
+            if reread:
+                self.cards.clear()
+                self.records = self.size = self.newest_id = 0
+                self.inode = stat.st_ino
+            file.seek(self.size)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Still being written
+                self.size += len(line)
+                try:
+                    card_id, due, interval, ease = json.loads(line)
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    continue
+                self.records += 1
+                if due is None:  # The card was deleted
+                    self.cards.pop(card_id, None)
+                    continue
+                self.cards[card_id] = [due, interval, ease]
+                self.newest_id = max(self.newest_id, card_id)
+                if not reread:
+                    heapq.heappush(self.heap, (due, card_id))
+        if reread:
+            self.rebuild_heap()
+
+    def rebuild_heap(self):
+        """
+        Rebuilds the heap from the current schedule, dropping stale pairs.
+        """
+        self.heap = [(entry[0], card_id) for card_id, entry in
+                     self.cards.items()]
+        heapq.heapify(self.heap)
+
+    def peek(self):
+        """
+        Returns the (due, card_id) pair of the card due soonest, or None
+        if no card has been reviewed.
+        """
+        while self.heap:
+            due, card_id = self.heap[0]
+            entry = self.cards.get(card_id)
+            if entry is not None and entry[0] == due:
+                return due, card_id
+            heapq.heappop(self.heap)  # Rescheduled or deleted since
+        return None
+
+    def reschedule(self, card_id, correct, now):
+        """
+        Schedules a card's next review from an answer. A correct answer
+        multiplies the interval by the card's ease, starting at one day;
+        a missed card has its ease lowered and comes back after
+        REVIEW_RETRY_SECONDS.
+        """
+        with file_lock(self.path):
+            self.catch_up()  # Build on reviews from other sessions
+            _, interval, ease = self.cards.get(card_id, (None, 0.0, 2.5))
+            if correct:
+                interval = max(1.0, interval * ease)
+                due = now + interval * 24 * 60 * 60
+            else:
+                interval = 0.0
+                ease = max(1.3, ease - 0.2)
+                due = now + REVIEW_RETRY_SECONDS
+            entry = [round(due), round(interval, 3), round(ease, 2)]
+            self.cards[card_id] = entry
+            self.newest_id = max(self.newest_id, card_id)
+            heapq.heappush(self.heap, (entry[0], card_id))
+            self.write([card_id] + entry)
+
+    def forget(self, card_id):
+        """
+        Removes a deleted card from the schedule.
+        """
+        with file_lock(self.path):
+            if self.cards.pop(card_id, None) is not None:
+                self.write([card_id, None, None, None])
+
+    def write(self, record):
+        """
+        Appends one record to the schedule file, compacting the file and
+        the heap once they hold too many superseded entries. Called with
+        the schedule file locked and read up to its end.
+        """
+        with open(self.path, "ab") as file:
+            if self.inode is None:  # A new schedule file
+                self.inode = os.fstat(file.fileno()).st_ino
+            file.write(json.dumps(record).encode() + b"\n")
+            self.size = file.tell()
+        self.records += 1
+        limit = 2 * len(self.cards) + REVIEW_COMPACT_RECORDS
+        if len(self.heap) > limit:
+            self.rebuild_heap()
+        if self.records > limit:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites the schedule file with one line per scheduled card.
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            for card_id, entry in self.cards.items():
+                file.write(json.dumps([card_id] + entry).encode() + b"\n")
+            self.size = file.tell()
+            self.inode = os.fstat(file.fileno()).st_ino
+        os.replace(temp_path, self.path)
+        self.records = len(self.cards)
+
+
+def get_review_schedule():
+    """
+    Returns the review schedule, loading it on first use and picking up
+    reviews saved by other sessions since.
+    """
+    global review_schedule
+    if review_schedule is None:
+        review_schedule = ReviewSchedule(review_schedule_file)
+    review_schedule.catch_up()
+    return review_schedule
+
+
+def next_review_card(schedule, now):
+    """
+    Returns the flashcard to review next: the card that has been due the
+    longest, otherwise the first card that was never reviewed, otherwise
+    None. Cards deleted since they were scheduled are dropped on the way.
+    """
+    while True:
+        top = schedule.peek()
+        if top is None or top[0] > now:
+            break
+        flashcard = find_card(top[1])
+        if flashcard is not None:
+            return flashcard
+        schedule.forget(top[1])
+    position = card_id_position(schedule.newest_id + 1)
+    if position < len(flashcards):
+        return flashcards[position]
+    return None
+
+
+# --- Card Statistics ---
+
+
+class CardStatistics:
+    """
+    How often each flashcard was asked and answered correctly, and when
+    it was last asked. The file holds one record of CARD_STATS_FIELDS
+    unsigned 32-bit numbers per card id, at the offset given by the id,
+    and is memory-mapped as one flat array. Recording an answer changes
+    three numbers in place, in O(1) however large the deck is, and only
+    the page that holds them is written back. Sessions map the same file,
+    so each sees the others' answers at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.fields = None  # The map as an array of unsigned ints
+
+    def records(self):
+        """
+        Returns the number of card ids the map covers.
+        """
+        if self.fields is None:
+            return 0
+        return len(self.fields) // CARD_STATS_FIELDS
+
+    def remap(self, card_id=None):
+        """
+        Maps the file again if it has grown since it was mapped, e.g. in
+        another session. With card_id given, first creates or grows the
+        file, doubling it, until it has a record for that id; this must be
+        done with the file locked.
+        """
+        flags = os.O_RDWR if card_id is None else os.O_RDWR | os.O_CREAT
+        try:
+            descriptor = os.open(self.path, flags, 0o644)
+        except FileNotFoundError:
+            return
+        try:
+            records = os.fstat(descriptor).st_size // CARD_STATS_RECORD_SIZE
+            if card_id is not None and card_id >= records:
+                records = max(
+                    card_id + 1, 2 * records, CARD_STATS_MIN_RECORDS
+                )
+                os.ftruncate(descriptor, records * CARD_STATS_RECORD_SIZE)
+            if records <= self.records():
+                return
+            self.close()
+            self.map = mmap.mmap(
+                descriptor, records * CARD_STATS_RECORD_SIZE
+            )
+        finally:
+            os.close(descriptor)
+        self.fields = memoryview(self.map).cast("I")
+
+    def get(self, card_id):
+        """
+        Returns the attempts, correct answers and last time asked for a
+        card, all 0 if it was never asked.
+        """
+        if card_id >= self.records():
+            self.remap()
+            if card_id >= self.records():
+                return 0, 0, 0
+        start = card_id * CARD_STATS_FIELDS
+        return tuple(self.fields[start:start + CARD_STATS_FIELDS])
+
+    def record(self, card_id, correct, now):
+        """
+        Counts one answer to a card, asked at the Unix time now.
+        """
+        with file_lock(self.path):
+            if card_id >= self.records():
+                self.remap(card_id)
+            start = card_id * CARD_STATS_FIELDS
+            self.fields[start] += 1
+            self.fields[start + 1] += correct
+            self.fields[start + 2] = int(now)
+        count_bytes("written", CARD_STATS_RECORD_SIZE)
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        if self.fields is not None:
+            self.fields.release()
+            self.map.close()
+            self.fields = self.map = None
+
+
+def most_missed_cards(count=ANALYTICS_MISSED_CARDS):
+    """
+    Returns the ids of up to count cards answered wrongly most often,
+    most missed first and lower ids first among equals, from one pass
+    over the attempts and correct answers of every card.
+    """
+    statistics = get_card_statistics()
+    statistics.remap()
+    if statistics.fields is None:
+        return []
+    if numpy is not None:
+        records = numpy.asarray(statistics.fields).reshape(
+            -1, CARD_STATS_FIELDS
+        )
+        misses = records[:, 0].astype(numpy.int64) - records[:, 1]
+        ranked = numpy.argsort(-misses, kind="stable")[:count]
+        return [int(card_id) for card_id in ranked if misses[card_id]]
+    fields = statistics.fields
+    misses = array(
+        "I",
+        map(
+            operator.sub,
+            fields[0::CARD_STATS_FIELDS],
+            fields[1::CARD_STATS_FIELDS],
+        ),
+    )
+    ranked = heapq.nlargest(count, range(len(misses)), key=misses.__getitem__)
+    return [card_id for card_id in ranked if misses[card_id]]
+
+
+def get_card_statistics():
+    """
+    Returns the card statistics, opening them on first use.
+    """
+    global card_stats
+    if card_stats is None:
+        card_stats = CardStatistics(card_stats_file)
+    return card_stats
+
+
+def record_answer(flashcard, correct):
+    """
+    Adds an answer to the flashcard's statistics.
+    """
+    with storage_lock:
+        get_card_statistics().record(flashcard.card_id, correct, time.time())
 
 
 # --- Quiz Functions ---
 
 
+@instrumented("start_quiz")
 def start_quiz():
     """
     Initiates a quiz session with a selected category or all categories.
@@ -506,28 +3507,27 @@ def start_quiz():
     """
     print_section_title("Quiz Mode")
     if not flashcards:
-        print(
+        emit(
             "No Quiz Cards available for quiz. Please add Quiz Cards first."
         )
-        print("\nReturning to Main Menu...")
+        emit("\nReturning to Main Menu...")
         return
 
     # Add guidance for answer formatting
-    print("\nNote: Answers must include any punctuation and ")
-    print("exact capitalization as shown on the Quiz Card.")
-    print("\nFor example, if a term has a period at the end, ")
-    print("include it in your answer.")
+    emit("\nNote: Answers must include any punctuation and ")
+    emit("exact capitalization as shown on the Quiz Card.")
+    emit("\nFor example, if a term has a period at the end, ")
+    emit("include it in your answer.")
 
     while True:  # Main quiz loop for selecting categories and starting quizzes
 
         # Display available categories
-        unique_categories = sorted(
-            set(fc["category"] or "Uncategorized" for fc in flashcards)
-        )
-        print("\nAvailable Categories:")
+        unique_categories = get_categories()
+        emit("\nAvailable Categories:")
         for idx, category in enumerate(unique_categories, start=1):
-            print(f"\n{idx}. {category}")
-        print(f"{len(unique_categories) + 1}. All Categories")
+            emit(f"\n{idx}. {category}")
+        emit(f"{len(unique_categories) + 1}. All Categories")
+        emit(f"{len(unique_categories) + 2}. Spaced Repetition Review")
 
         # Prompt user for category selection
         try:
@@ -535,30 +3535,32 @@ def start_quiz():
                 "\nSelect a category by number "
                 "(or choose 'All Categories'):\n",
                 1,
-                len(unique_categories) + 1,
+                len(unique_categories) + 2,
             )
             if 1 <= selection <= len(unique_categories):
                 category = unique_categories[selection - 1]
 
-                # Filter flashcards by the selected category
-                category_flashcards = [
-                    fc
-                    for fc in flashcards
-                    if (fc["category"] or "Uncategorized") == category
-                ]
+                # Look up the selected category's flashcards
+                category_flashcards = get_category_flashcards(category)
 
                 # Check if there are any flashcards in the selected category
                 if not category_flashcards:
-                    print(
+                    emit(
                         f"\nNo Quiz Cards found for category '{category}'. "
                         "Please add flashcards to this category."
                     )
                     return
 
-                print(f"\nStarting quiz on category '{category}'...")
+                emit(f"\nStarting quiz on category '{category}'...")
             elif selection == len(unique_categories) + 1:
-                category_flashcards = flashcards  # All categories selected
-                print("\nStarting quiz on all categories...")
+                category_flashcards = all_flashcards()  # All categories
+                emit("\nStarting quiz on all categories...")
+            elif selection == len(unique_categories) + 2:
+                category_flashcards = None  # Cards come from the schedule
+                emit(
+                    "\nStarting spaced repetition review: cards that are "
+                    "due come first, then cards not yet reviewed..."
+                )
             else:
                 print_error(
                     "\nInvalid selection. "
@@ -570,29 +3572,38 @@ def start_quiz():
             continue
 
         # Prompt for the number of questions
-        max_questions = len(category_flashcards)
+        max_questions = len(
+            flashcards if category_flashcards is None else category_flashcards
+        )
         num_questions = get_valid_integer(
             f"\nHow many questions would you like? (1-{max_questions}):\n",
             1,
             max_questions,
         )
-        # Run the quiz
-        run_quiz(
-            category_flashcards,
-            num_questions,
-            category_name=(
-                unique_categories[selection - 1]
-                if selection <= len(unique_categories)
-                else "All Categories"
-            ),
+        category_name = (
+            unique_categories[selection - 1]
+            if selection <= len(unique_categories)
+            else "All Categories"
         )
+        if category_flashcards is None:
+            run_review(num_questions)
+        else:
+            # Kept for retries, so missed cards come up more often next time
+            sampler = quiz_sampler(category_flashcards)
+            # Run the quiz
+            run_quiz(
+                category_flashcards,
+                num_questions,
+                category_name=category_name,
+                sampler=sampler,
+            )
 
         # Post-quiz options
         while True:
-            print("\nQuiz Complete! What would you like to do next?")
-            print("\n1. Try the same quiz again")
-            print("2. Start a new quiz")
-            print("3. Return to Main Menu")
+            emit("\nQuiz Complete! What would you like to do next?")
+            emit("\n1. Try the same quiz again")
+            emit("2. Start a new quiz")
+            emit("3. Return to Main Menu")
 
             next_action = get_valid_integer(
                 "\nChoose an option (1-3):\n",
@@ -600,89 +3611,172 @@ def start_quiz():
                 3,
             )
 
-            if next_action == 1:
+            if next_action == 1 and category_flashcards is None:
+                # Review whichever cards are due now
+                run_review(num_questions)
+            elif next_action == 1:
                 # Retry the same quiz with the same category and question count
                 run_quiz(
                     category_flashcards,
                     num_questions,
-                    category_name=(
-                        unique_categories[selection - 1]
-                        if selection <= len(unique_categories)
-                        else "All Categories"
-                    ),
+                    category_name=category_name,
+                    sampler=sampler,
                 )
             elif next_action == 2:
                 # Restart the main quiz loop to select a new category
                 break
             elif next_action == 3:
                 # Exit to the main menu
-                print("\nReturning to Main Menu...")
+                emit("\nReturning to Main Menu...")
                 return
 
 
 def run_quiz(
-    category_flashcards, num_questions, category_name="All Categories"
+    category_flashcards,
+    num_questions,
+    category_name="All Categories",
+    sampler=None,
 ):
     """
     Runs the quiz for the selected category with a
     specified number of questions.
     Randomly selects flashcards to quiz the user, either term or definition,
-    and tracks correct answers.
+    and tracks correct answers. Cards are drawn from the weighted sampler
+    without replacement, and each answer updates the card's weight.
     If at least one question was attempted, saves progress.
     """
+    if sampler is None:
+        sampler = quiz_sampler(category_flashcards)
+    answered = {}  # Position -> weight to restore once the quiz ends
+    try:
+        run_quiz_questions(
+            category_flashcards,
+            num_questions,
+            category_name,
+            sampler,
+            answered,
+        )
+    finally:
+        for position, weight in answered.items():
+            sampler.update(position, weight)
+
+
+def run_quiz_questions(
+    category_flashcards, num_questions, category_name, sampler, answered
+):
+    """
+    Asks the questions for run_quiz. Each card drawn is given a weight of
+    zero until the quiz ends, so no card is asked twice in one quiz.
+    """
     correct_count = 0
     total_questions = 0
 
-    while total_questions < num_questions:
-        flashcard = random.choice(category_flashcards)
-        question_asked = False  # Track if the question has been answered
-
-        while not question_asked:
-            if random.choice([True, False]):
-                user_answer = input(
-                    f"\nWhat is the definition of '{flashcard['term']}'? "
-                    "(or type 'exit' to quit):\n"
-                ).strip()
-                correct_answer = flashcard["definition"]
-            else:
-                definition = flashcard['definition']
-                user_answer = input(
-                    f"\nWhat term matches the definition '{definition}'? "
-                    "(or type 'exit' to quit): "
-                ).strip()
-                correct_answer = flashcard["term"]
-
-            if user_answer.lower() == "exit":
-                return  # End the quiz if the user wants to exit
-            elif not user_answer:  # Check for empty input
-                print("\nNo answer provided. Please enter an answer.")
-            elif user_answer.lower() == correct_answer.lower():
-                print("\nCorrect!")
-                correct_count += 1
-                question_asked = True  # Mark question as answered
-            else:
-                print(f"\nIncorrect. The correct answer is: {correct_answer}")
-                question_asked = True  # Mark question as answered
+    while total_questions < num_questions and sampler.positive:
+        position = sampler.sample()
+        flashcard = category_flashcards[position]
+        if flashcard is None:
+            sampler.update(position, 0.0)  # Deleted in another session
+            continue
+        answered[position] = sampler.weights[position]
+        sampler.update(position, 0.0)
+        correct = ask_question(flashcard)
+        if correct is None:
+            return  # End the quiz if the user wants to exit
+        record_answer(flashcard, correct)
+        correct_count += correct
+        answered[position] = sampler.record_answer(
+            flashcard.card_id, correct
+        )
+        total_questions += 1
+
+    finish_quiz(category_name, correct_count, total_questions)
+
+
+def run_review(num_questions):
+    """
+    Runs a spaced repetition review of up to num_questions cards, taken
+    from the review schedule rather than by scanning the deck. Each answer
+    reschedules the card: cards answered correctly come back after a
+    growing interval and missed cards come back soon.
+    """
+    correct_count = 0
+    total_questions = 0
 
+    while total_questions < num_questions:
+        with storage_lock:
+            schedule = get_review_schedule()
+            flashcard = next_review_card(schedule, time.time())
+        if flashcard is None:
+            emit("\nNo more Quiz Cards are due for review.")
+            break
+        correct = ask_question(flashcard)
+        if correct is None:
+            return  # End the review if the user wants to exit
+        with storage_lock:
+            schedule.reschedule(flashcard.card_id, correct, time.time())
+        record_answer(flashcard, correct)
+        correct_count += correct
         total_questions += 1
 
-    # Only save progress if at least one question was attempted
+    finish_quiz("Spaced Repetition", correct_count, total_questions)
+
+
+def ask_question(flashcard):
+    """
+    Asks for either the definition or the term of a flashcard until an
+    answer is given. Returns whether the answer was correct, or None if
+    the user typed 'exit'.
+    """
+    while True:
+        if random.choice([True, False]):
+            user_answer = read_input(
+                f"\nWhat is the definition of '{flashcard['term']}'? "
+                "(or type 'exit' to quit):\n"
+            ).strip()
+            correct_answer = flashcard["definition"]
+        else:
+            definition = flashcard['definition']
+            user_answer = read_input(
+                f"\nWhat term matches the definition '{definition}'? "
+                "(or type 'exit' to quit): "
+            ).strip()
+            correct_answer = flashcard["term"]
+
+        if user_answer.lower() == "exit":
+            return None
+        elif not user_answer:  # Check for empty input
+            emit("\nNo answer provided. Please enter an answer.")
+        elif user_answer.lower() == correct_answer.lower():
+            emit("\nCorrect!")
+            return True
+        else:
+            emit(f"\nIncorrect. The correct answer is: {correct_answer}")
+            return False
+
+
+def finish_quiz(category_name, correct_count, total_questions):
+    """
+    Shows the score and saves progress, if at least one question was
+    attempted.
+    """
     if total_questions > 0:
-        print(
+        emit(
             f"\nQuiz complete! "
             f"You scored {correct_count} out of {total_questions}."
         )
         save_progress(category_name, correct_count, total_questions)
     else:
-        print("\nNo questions were attempted; progress will not be saved.")
+        emit("\nNo questions were attempted; progress will not be saved.")
 
 
+@instrumented("save_progress")
 def save_progress(category, correct_count, total_questions):
     """
     Saves quiz results to the progress file with
     category, score, total questions, and success rate.
-    If the file is missing or corrupted, initializes it as an
-    empty list. Appends the new entry and saves it in JSON format.
+    The new entry is appended as one JSON line, so saving does not
+    depend on the size of the existing history, and is added to the
+    running aggregates in the progress summary file.
     """
     # Calculate success rate
     success_rate = (
@@ -690,30 +3784,46 @@ def save_progress(category, correct_count, total_questions):
     )
     # Create progress entry
     progress_entry = {
-        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "date": datetime.now().strftime(PROGRESS_DATE_FORMAT),
         "category": category,
         "score": correct_count,
         "total_questions": total_questions,
         "success_rate": round(success_rate, 2),
     }
-    try:
-        # Load existing progress data or create new list
-        with open(progress_file, "r") as file:
-            progress_data = json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        progress_data = []
-
-    # Append new entry and save back to file
-    progress_data.append(progress_entry)
-    with open(progress_file, "w") as file:
-        json.dump(progress_data, file, indent=4)
+    with storage_lock, file_lock(progress_file):
+        summary = load_progress_summary()  # Checked against the history
+        if storage_mode == "sqlite":
+            with connect_database():
+                database.execute(
+                    "INSERT INTO progress (date, category, score, "
+                    "total_questions, success_rate) VALUES (:date, "
+                    ":category, :score, :total_questions, :success_rate)",
+                    progress_entry,
+                )
+        else:
+            # Append the new entry as a single line
+            with open(progress_file, "ab+") as file:
+                if file.tell() > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":  # Close off a broken line
+                        file.write(b"\n")
+                line = json.dumps(progress_entry).encode() + b"\n"
+                file.write(line)
+                count_bytes("written", len(line))
 
-    print("\nProgress saved successfully!")
+        add_to_summary(summary["overall"], progress_entry)
+        add_to_summary(
+            summary["categories"].setdefault(category, empty_summary()),
+            progress_entry,
+        )
+        save_progress_summary(summary)
+    emit("\nProgress saved successfully!")
 
 
 # --- Progress Management Function ---
 
 
+@instrumented("view_progress")
 def view_progress():
     """
     Displays all quiz progress entries with
@@ -726,62 +3836,50 @@ def view_progress():
     """
     print_section_title("View Progress")
     try:
-        with open(progress_file, "r") as file:
-            progress_data = json.load(file)
-        if not progress_data:
-            print("No quiz progress available.")
-            print("\nReturning to Main Menu...")
+        progress_data = read_progress()
+        entry = next(progress_data, None)
+        if entry is None:
+            emit("No quiz progress available.")
+            emit("\nReturning to Main Menu...")
             return
 
-        print("Quiz Progress History:")
-        total_score = 0
-        total_questions = 0
-        highest_score = 0
-        lowest_score = None
-        num_quizzes = len(progress_data)
-        all_zero_scores = True  # Flag to track if all scores are zero
-
-        for entry in progress_data:
-            print(f"Date: {entry['date']}")
-            print(f"Category: {entry['category']}")
-            print(f"Score: {entry['score']} / {entry['total_questions']}")
-            print(f"Success Rate: {entry['success_rate']}%")
-            print("-" * 30)
-
-            # Accumulate statistics
-            total_score += entry["score"]
-            total_questions += entry["total_questions"]
-            if entry["score"] > 0:
-                all_zero_scores = False  # At least one non-zero score found
-            if entry["score"] > highest_score:
-                highest_score = entry["score"]
-            if lowest_score is None or (
-                entry["score"] < lowest_score and entry["score"] > 0
-            ):
-                lowest_score = entry["score"]
-        # Calculate average success rate
-        average_success_rate = (
-            (total_score / total_questions) * 100 if total_questions > 0 else 0
+        emit("Quiz Progress History:")
+        emit_paged(
+            f"Date: {entry['date']}\n"
+            f"Category: {entry['category']}\n"
+            f"Score: {entry['score']} / {entry['total_questions']}\n"
+            f"Success Rate: {entry['success_rate']}%\n" + "-" * 30
+            for entry in itertools.chain([entry], progress_data)
         )
+
+        progress_summary = load_progress_summary()
+        summary = progress_summary["overall"]
+        # Calculate average success rate
+        average_success_rate = average_rate(summary)
         # Display summary statistics
-        print("\nProgress Summary:")
-        print(f"Total Quizzes Taken: {num_quizzes}")
-        print(f"Average Success Rate: {average_success_rate:.2f}%")
-        print(f"Highest Score Achieved: {highest_score}")
+        emit("\nProgress Summary:")
+        emit(f"Total Quizzes Taken: {summary['num_quizzes']}")
+        emit(f"Average Success Rate: {average_success_rate:.2f}%")
+        emit(f"Highest Score Achieved: {summary['highest_score']}")
         # Display lowest score or a message if all scores are zero
-        if all_zero_scores:
-            print(
+        if summary["lowest_score"] is None:
+            emit(
                 "Lowest Score Achieved:"
                 "No completed quizzes with a non-zero score."
             )
         else:
-            print(
-                f"Lowest Score Achieved: "
-                f"{lowest_score if lowest_score is not None else 0}"
+            emit(f"Lowest Score Achieved: {summary['lowest_score']}")
+        emit("\nAverage Success Rate by Category:")
+        for category, category_summary in sorted(
+            progress_summary["categories"].items()
+        ):
+            emit(
+                f"{category}: {average_rate(category_summary):.2f}% over "
+                f"{category_summary['num_quizzes']} quizzes"
             )
         # Offer option to clear progress with stricter input handling
         while True:
-            clear_progress = input(
+            clear_progress = read_input(
                 "\nWould you like to clear all quiz progress? (yes/no):\n"
             ).strip().lower()
             if clear_progress == "yes":
@@ -789,26 +3887,634 @@ def view_progress():
                     "\nAre you sure you want to delete all progress? "
                     "This action cannot be undone. (yes/no): "
                 )
-                confirm_clear = input(
+                confirm_clear = read_input(
                     f"{confirmation_message}\n"
                 ).strip().lower()
                 if confirm_clear == "yes":
-                    with open(progress_file, "w") as file:
-                        json.dump([], file)
-                    print("\nAll quiz progress has been cleared.")
+                    clear_progress_history()
+                    emit("\nAll quiz progress has been cleared.")
                 else:
-                    print("\nClear progress cancelled.")
+                    emit("\nClear progress cancelled.")
                 break
             elif clear_progress == "no":
-                print("\nReturning to Main Menu...")
+                emit("\nReturning to Main Menu...")
                 break
             else:
-                print("\nInvalid input. Please enter 'yes' or 'no'.")
+                emit("\nInvalid input. Please enter 'yes' or 'no'.")
 
     except FileNotFoundError:
-        print("\nNo quiz progress available.")
-    except json.JSONDecodeError:
-        print_error("\nProgress data file is corrupted.")
+        emit("\nNo quiz progress available.")
+
+
+def empty_summary():
+    """
+    Returns the aggregates for an empty progress history: number of
+    quizzes, total score, total questions, highest score and lowest
+    non-zero score (None while every score is zero).
+    """
+    return {
+        "num_quizzes": 0,
+        "total_score": 0,
+        "total_questions": 0,
+        "highest_score": 0,
+        "lowest_score": None,
+    }
+
+
+def add_to_summary(summary, entry):
+    """
+    Adds one progress entry to a set of running aggregates.
+    """
+    summary["num_quizzes"] += 1
+    summary["total_score"] += entry["score"]
+    summary["total_questions"] += entry["total_questions"]
+    summary["highest_score"] = max(summary["highest_score"], entry["score"])
+    if entry["score"] > 0 and (
+        summary["lowest_score"] is None
+        or entry["score"] < summary["lowest_score"]
+    ):
+        summary["lowest_score"] = entry["score"]
+
+
+def average_rate(summary):
+    """
+    Returns the average success rate, as a percentage, of a summary.
+    """
+    if summary["total_questions"] == 0:
+        return 0
+    return (summary["total_score"] / summary["total_questions"]) * 100
+
+
+def progress_history_marker():
+    """
+    Returns a cheap marker of how far the progress history goes: the size
+    of the progress file, or the last row id in SQLite mode. The summary
+    file records the marker it was built for so drift can be detected.
+    """
+    if storage_mode == "sqlite":
+        return connect_database().execute(
+            "SELECT MAX(id) FROM progress"
+        ).fetchone()[0]
+    try:
+        return os.path.getsize(progress_file)
+    except FileNotFoundError:
+        return None
+
+
+def load_progress_summary():
+    """
+    Returns the overall and per-category aggregates from the progress
+    summary file. Rebuilds them from the history if the file is missing
+    or does not match the current history.
+    """
+    try:
+        with open(progress_summary_file, "r") as file:
+            summary = json.load(file)
+            count_bytes("read", os.fstat(file.fileno()).st_size)
+        if summary["marker"] == progress_history_marker():
+            return summary
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        pass
+    with storage_lock, file_lock(progress_file):  # Nothing appended meanwhile
+        return rebuild_progress_summary()
+
+
+def rebuild_progress_summary():
+    """
+    Regenerates the progress summary file with one pass over the history
+    and returns the new aggregates.
+    """
+    summary = {"overall": empty_summary(), "categories": {}}
+    for entry in read_progress():
+        add_to_summary(summary["overall"], entry)
+        add_to_summary(
+            summary["categories"].setdefault(
+                entry["category"], empty_summary()
+            ),
+            entry,
+        )
+    save_progress_summary(summary)
+    return summary
+
+
+def save_progress_summary(summary):
+    """
+    Writes the aggregates, with the current history marker, to the
+    progress summary file.
+    """
+    summary["marker"] = progress_history_marker()
+    temp_filename = progress_summary_file + ".tmp"
+    with open(temp_filename, "w") as file:
+        json.dump(summary, file)
+        count_bytes("written", file.tell())
+    os.replace(temp_filename, progress_summary_file)
+
+
+def clear_progress_history():
+    """
+    Deletes every stored progress entry and resets the aggregates.
+    """
+    with storage_lock, file_lock(progress_file):
+        if storage_mode == "sqlite":
+            with connect_database():
+                database.execute("DELETE FROM progress")
+        else:
+            open(progress_file, "w").close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(progress_index_file)
+        save_progress_summary({"overall": empty_summary(), "categories": {}})
+
+
+# --- Progress History Functions ---
+
+
+def date_number(date):
+    """
+    Returns a date in PROGRESS_DATE_FORMAT, or a datetime, as a number
+    that sorts the same way: 20240131093000 for 2024-01-31 09:30:00.
+    """
+    if isinstance(date, datetime):
+        date = date.strftime(PROGRESS_DATE_FORMAT)
+    return int(date.replace("-", "").replace(":", "").replace(" ", ""))
+
+
+class ProgressIndex:
+    """
+    The quizzes in the progress file ordered by date, so the quizzes in a
+    date range are found by binary search and only their lines are read.
+    Each quiz has its date (see date_number) and the offsets where its
+    line starts and ends. The index is saved to its own file, a header
+    line naming the progress file's inode followed by the three numbers
+    of each quiz, and is extended with the lines appended since, so the
+    history is only read in full once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every indexed quiz. New arrays are made, so a range found
+        before keeps the arrays it was found in.
+        """
+        self.dates = array("q")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.in_order = True  # Quizzes were saved in date order
+        self.by_date = None  # (dates, positions) sorted, if not in order
+        self.header = None  # Header line of the index file read
+        self.size = 0  # Bytes of the index file read so far
+
+    def catch_up(self):
+        """
+        Reads the quizzes added to the index file since it was last read,
+        then indexes and saves any quizzes appended to the progress file
+        after them. Starts again if the progress file was replaced or
+        cleared since it was indexed. Must be called with the progress
+        file locked.
+        """
+        try:
+            stat = os.stat(progress_file)
+        except FileNotFoundError:
+            self.reset()
+            return
+        self.read_saved()
+        if self.header is not None and not self.matches(stat):
+            self.reset()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+        self.index_lines(stat)
+
+    def read_saved(self):
+        """
+        Reads the records appended to the index file since it was last
+        read, rereading it all if it is a different file.
+        """
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            self.reset()
+            return
+        with file:
+            header = file.readline()
+            if header != self.header:
+                self.reset()
+                self.header = header
+                self.size = len(header)
+            file.seek(self.size)
+            data = file.read()
+        record_size = 3 * self.dates.itemsize
+        data = data[:len(data) - len(data) % record_size]
+        self.size += len(data)
+        records = array("q")
+        records.frombytes(data)
+        count_bytes("read", len(data))
+        self.add(records[0::3], records[1::3], records[2::3])
+
+    def matches(self, stat):
+        """
+        Returns whether the index was made from the progress file as it
+        is now: the same file, still holding the last quiz indexed.
+        """
+        try:
+            if json.loads(self.header)["inode"] != stat.st_ino:
+                return False
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return False
+        if not self.ends:
+            return True
+        if stat.st_size < self.ends[-1]:
+            return False
+        with open(progress_file, "rb") as file:
+            file.seek(self.starts[-1])
+            line = file.read(self.ends[-1] - self.starts[-1])
+        try:
+            return date_number(json.loads(line)["date"]) == self.dates[-1]
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return False
+
+    def index_lines(self, stat):
+        """
+        Indexes the whole lines of the progress file after the last quiz
+        indexed, skipping lines that cannot be parsed, and appends them to
+        the index file.
+        """
+        indexed = self.ends[-1] if self.ends else 0
+        if stat.st_size <= indexed:
+            return
+        dates, starts, ends = array("q"), array("q"), array("q")
+        with open(progress_file, "rb") as file:
+            file.seek(indexed)
+            position = indexed
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # An interrupted write
+                start, position = position, position + len(line)
+                try:
+                    date = date_number(json.loads(line)["date"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    continue
+                dates.append(date)
+                starts.append(start)
+                ends.append(position)
+            count_bytes("read", position - indexed)
+        if not dates:
+            return
+        records = array(
+            "q", itertools.chain.from_iterable(zip(dates, starts, ends))
+        )
+        with open(self.path, "ab" if self.header else "wb") as file:
+            if not self.header:
+                self.header = json.dumps({"inode": stat.st_ino}).encode()
+                self.header += b"\n"
+                file.write(self.header)
+            file.write(records.tobytes())
+            count_bytes("written", file.tell() - self.size)
+            self.size = file.tell()
+        self.add(dates, starts, ends)
+
+    def add(self, dates, starts, ends):
+        """
+        Adds quizzes to the end of the index, noting if they break the
+        date order (e.g. after the clock was put back).
+        """
+        if not dates:
+            return
+        if (self.dates and dates[0] < self.dates[-1]) or any(
+            map(operator.gt, dates, dates[1:])
+        ):
+            self.in_order = False
+        self.by_date = None
+        self.dates.extend(dates)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+
+    def positions(self, start=None, end=None):
+        """
+        Returns the positions of the quizzes dated from start up to, but
+        not including, end (date numbers; None leaves that side open), in
+        date order.
+        """
+        dates, order = self.dates, None
+        if not self.in_order:
+            if self.by_date is None:
+                order = sorted(range(len(dates)), key=dates.__getitem__)
+                self.by_date = (
+                    array("q", map(dates.__getitem__, order)),
+                    order,
+                )
+            dates, order = self.by_date
+        low = 0 if start is None else bisect.bisect_left(dates, start)
+        high = len(dates) if end is None else bisect.bisect_left(dates, end)
+        return range(low, high) if order is None else order[low:high]
+
+
+def get_progress_index():
+    """
+    Returns the progress index, loading it on first use and bringing it
+    up to date with the progress file. Must be called with the progress
+    file locked.
+    """
+    global progress_index
+    if progress_index is None:
+        progress_index = ProgressIndex(progress_index_file)
+    progress_index.catch_up()
+    return progress_index
+
+
+def read_progress_range(start=None, end=None, category=None):
+    """
+    Yields the progress entries dated from start up to, but not
+    including, end (datetimes; None leaves that side open), oldest
+    first, and only those in category if one is given. The range is
+    found by binary search on the dates, so only its entries are read.
+    """
+    if storage_mode == "sqlite":
+        yield from read_database_progress_range(start, end, category)
+        return
+    with storage_lock, file_lock(progress_file):
+        index = get_progress_index()
+        starts, ends = index.starts, index.ends
+        positions = index.positions(
+            None if start is None else date_number(start),
+            None if end is None else date_number(end),
+        )
+    try:
+        file = open(progress_file, "rb")
+    except FileNotFoundError:
+        return
+    with file:
+        for position in positions:
+            file.seek(starts[position])
+            line = file.read(ends[position] - starts[position])
+            count_bytes("read", len(line))
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Cleared meanwhile
+            if category is None or entry["category"] == category:
+                yield entry
+
+
+def view_progress_range(start=None, end=None, category=None):
+    """
+    Displays the quizzes taken from start up to, but not including, end
+    (in category, if given), with their number and success rate.
+    """
+    entries = list(read_progress_range(start, end, category))
+    if not entries:
+        emit("\nNo quizzes were taken in that period.")
+        return
+    summary = empty_summary()
+    for entry in entries:
+        add_to_summary(summary, entry)
+    emit_paged(
+        f"Date: {entry['date']}\n"
+        f"Category: {entry['category']}\n"
+        f"Score: {entry['score']} / {entry['total_questions']}\n"
+        f"Success Rate: {entry['success_rate']}%\n" + "-" * 30
+        for entry in entries
+    )
+    emit(
+        f"\n{summary['num_quizzes']} quizzes, average success rate "
+        f"{average_rate(summary):.2f}%"
+    )
+
+
+def ask_category_filter():
+    """
+    Asks which category to show, returning None for all categories.
+    """
+    category = read_input(
+        "\nEnter a category, or leave blank for all categories:\n"
+    ).strip()
+    return category or None
+
+
+@instrumented("view_recent_progress")
+def view_recent_progress():
+    """
+    Displays the quizzes taken in the last number of days the user asks
+    for, optionally in one category.
+    """
+    print_section_title("Recent Progress")
+    days = get_valid_integer("How many days back? (1-3650):", 1, 3650)
+    category = ask_category_filter()
+    view_progress_range(
+        datetime.now() - timedelta(days=days), None, category
+    )
+
+
+@instrumented("view_progress_by_date")
+def view_progress_by_date():
+    """
+    Displays the quizzes taken between two dates the user enters, both
+    days included, optionally in one category.
+    """
+    print_section_title("Progress by Date")
+    first = get_valid_date("From date (YYYY-MM-DD):")
+    last = get_valid_date("To date (YYYY-MM-DD), included:")
+    category = ask_category_filter()
+    view_progress_range(first, last + timedelta(days=1), category)
+
+
+# --- Progress Analytics Functions ---
+
+
+def read_progress_columns():
+    """
+    Reads the progress history into columns, oldest quiz first: the
+    category names, then arrays of each quiz's category (as a position
+    in the names), score, number of questions and success rate.
+    """
+    names = {}
+    codes, scores, totals = array("I"), array("I"), array("I")
+    rates = array("d")
+    for entry in read_progress():
+        codes.append(names.setdefault(entry["category"], len(names)))
+        scores.append(entry["score"])
+        totals.append(entry["total_questions"])
+        rates.append(entry["success_rate"])
+    return list(names), codes, scores, totals, rates
+
+
+def group_by_category(codes, count, *columns):
+    """
+    Splits columns into one run of quizzes per category code, each still
+    oldest first, with one stable sort on the codes. Returns a list,
+    indexed by code, of the columns' runs for that category.
+    """
+    if numpy is not None:
+        codes = numpy.asarray(codes)
+        order = numpy.argsort(codes, kind="stable")
+        bounds = numpy.cumsum(numpy.bincount(codes, minlength=count))[:-1]
+        runs = [
+            numpy.split(numpy.asarray(column)[order], bounds)
+            for column in columns
+        ]
+        return list(zip(*runs))
+    order = sorted(range(len(codes)), key=codes.__getitem__)
+    columns = [
+        array(column.typecode, map(column.__getitem__, order))
+        for column in columns
+    ]
+    sizes = collections.Counter(codes)
+    groups = []
+    start = 0
+    for code in range(count):
+        end = start + sizes[code]
+        groups.append(tuple(column[start:end] for column in columns))
+        start = end
+    return groups
+
+
+def column_sum(values):
+    """
+    Returns the sum of a column of numbers.
+    """
+    return numpy.sum(values) if numpy is not None else sum(values)
+
+
+def rolling_averages(values, window=ANALYTICS_WINDOW):
+    """
+    Returns the average of every window consecutive values (of all of
+    them if there are fewer), computed from running sums rather than by
+    adding up each window.
+    """
+    window = min(window, len(values))
+    if numpy is not None:
+        sums = numpy.cumsum(numpy.concatenate(([0.0], values)))
+        return (sums[window:] - sums[:-window]) / window
+    sums = list(itertools.accumulate(values, initial=0.0))
+    return array(
+        "d",
+        map(
+            operator.truediv,
+            map(operator.sub, sums[window:], sums[:-window]),
+            itertools.repeat(window),
+        ),
+    )
+
+
+def percentiles(values, points=ANALYTICS_PERCENTILES):
+    """
+    Returns the given percentiles of values, interpolating linearly
+    between the nearest two like numpy.percentile does.
+    """
+    if numpy is not None:
+        return [float(value) for value in numpy.percentile(values, points)]
+    ordered = sorted(values)
+    results = []
+    for point in points:
+        position = (len(ordered) - 1) * point / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        results.append(
+            ordered[lower]
+            + (ordered[upper] - ordered[lower]) * (position - lower)
+        )
+    return results
+
+
+def success_trend(rates):
+    """
+    Returns the least-squares slope of the success rates against quiz
+    number, in percentage points per 100 quizzes (0 for a single quiz).
+    """
+    count = len(rates)
+    if count < 2:
+        return 0.0
+    middle = (count - 1) / 2
+    if numpy is not None:
+        products = numpy.dot(numpy.arange(count), numpy.asarray(rates))
+    else:
+        products = sum(map(operator.mul, range(count), rates))
+    covariance = products - middle * column_sum(rates)
+    variance = count * (count * count - 1) / 12
+    return float(covariance / variance * 100)
+
+
+def progress_statistics(scores, totals, rates, window=ANALYTICS_WINDOW):
+    """
+    Returns the statistics for a run of quizzes, oldest first: how many
+    there were, the overall success rate, percentiles of the per-quiz
+    rates, the average of the last window quizzes and the trend.
+    """
+    total_questions = int(column_sum(totals))
+    return {
+        "num_quizzes": len(rates),
+        "average": (
+            int(column_sum(scores)) / total_questions * 100
+            if total_questions
+            else 0
+        ),
+        "percentiles": dict(zip(ANALYTICS_PERCENTILES, percentiles(rates))),
+        "rolling_average": float(rolling_averages(rates, window)[-1]),
+        "trend": success_trend(rates),
+    }
+
+
+def progress_analytics(window=ANALYTICS_WINDOW):
+    """
+    Returns the statistics for the whole progress history and for each
+    category, or None if no quizzes were taken. Every statistic is
+    computed a column at a time, with NumPy if it is installed.
+    """
+    names, codes, scores, totals, rates = read_progress_columns()
+    if not rates:
+        return None
+    return {
+        "overall": progress_statistics(scores, totals, rates, window),
+        "categories": {
+            name: progress_statistics(*columns, window)
+            for name, columns in zip(
+                names,
+                group_by_category(codes, len(names), scores, totals, rates),
+            )
+        },
+    }
+
+
+def view_progress_analytics(window=ANALYTICS_WINDOW):
+    """
+    Displays the progress analytics overall and for each category, then
+    the cards missed most often.
+    """
+    analytics = progress_analytics(window)
+    if analytics is None:
+        emit("No quiz progress available.")
+        return
+    points = "/".join(str(point) for point in ANALYTICS_PERCENTILES)
+    for name, statistics in [("Overall", analytics["overall"])] + sorted(
+        analytics["categories"].items()
+    ):
+        rates = " / ".join(
+            f"{rate:.2f}%" for rate in statistics["percentiles"].values()
+        )
+        emit(f"\n{name}: {statistics['num_quizzes']} quizzes")
+        emit(f"Average Success Rate: {statistics['average']:.2f}%")
+        emit(f"Percentiles ({points}): {rates}")
+        emit(
+            f"Last {min(window, statistics['num_quizzes'])} Quizzes: "
+            f"{statistics['rolling_average']:.2f}%"
+        )
+        emit(
+            f"Trend: {statistics['trend']:+.2f} points per 100 quizzes"
+        )
+    missed = [
+        (flashcard, get_card_statistics().get(flashcard.card_id))
+        for flashcard in map(find_card, most_missed_cards())
+        if flashcard is not None  # Deleted since
+    ]
+    if missed:
+        emit("\nMost Missed Quiz Cards:")
+    for flashcard, (attempts, correct, last_seen) in missed:
+        emit(
+            f"{flashcard['term']}: missed {attempts - correct} of "
+            f"{attempts} times, last asked "
+            f"{datetime.fromtimestamp(last_seen):%Y-%m-%d %H:%M:%S}"
+        )
 
 
 # --- Main Control Functions ---
@@ -819,22 +4525,28 @@ def main_menu():
     Navigation menu.
     """
     while True:
-        print("\nQuiz Cards Main Menu\n")
-        print("1. Quiz Card Management")
-        print("2. Quiz Mode")
-        print("3. Progress Tracking")
-        print("4. Exit")
+        emit("\nQuiz Cards Main Menu\n")
+        emit("1. Quiz Card Management")
+        emit("2. Quiz Mode")
+        emit("3. Progress Tracking")
+        emit("4. Exit")
 
-        choice = input("\nPlease select an option (1-4):\n")
+        choice = read_input("\nPlease select an option (1-4):\n")
 
         if choice == "1":
             flashcard_management_menu()
         elif choice == "2":
             start_quiz()
         elif choice == "3":
-            view_progress()
+            progress_tracking_menu()
         elif choice == "4":
-            save_flashcards()
+            with storage_transaction():
+                if storage_mode == "json" and saver is not None:
+                    saver.flush()
+                elif storage_mode == "json":  # Other modes save each change
+                    save_flashcards()
+                elif storage_mode == "lazy":
+                    save_lazy_index()
             break
         else:
             print_error("\nInvalid option. Please try again.")
@@ -845,14 +4557,16 @@ def flashcard_management_menu():
     Submenu for managing flashcards.
     """
     while True:
-        print("\nQuiz Card Management\n")
-        print("1. Add a New Quiz Card")
-        print("2. View Quiz Cards")
-        print("3. Edit a Quiz Card")
-        print("4. Delete a Quiz Card")
-        print("5. Return to Main Menu")
+        emit("\nQuiz Card Management\n")
+        emit("1. Add a New Quiz Card")
+        emit("2. View Quiz Cards")
+        emit("3. Edit a Quiz Card")
+        emit("4. Delete a Quiz Card")
+        emit("5. Search Quiz Cards")
+        emit("6. Batch Changes")
+        emit("7. Return to Main Menu")
 
-        choice = input("\nPlease select an option (1-5):\n")
+        choice = read_input("\nPlease select an option (1-7):\n")
 
         if choice == "1":
             add_flashcard()
@@ -863,7 +4577,37 @@ def flashcard_management_menu():
         elif choice == "4":
             delete_flashcard()
         elif choice == "5":
-            print("\nReturning to Main Menu...")
+            find_flashcards()
+        elif choice == "6":
+            batch_change_flashcards()
+        elif choice == "7":
+            emit("\nReturning to Main Menu...")
+            break
+        else:
+            print_error("\nInvalid option. Please try again.")
+
+
+def progress_tracking_menu():
+    """
+    Submenu for viewing progress.
+    """
+    while True:
+        emit("\nProgress Tracking\n")
+        emit("1. View All Progress")
+        emit("2. View Recent Progress")
+        emit("3. View Progress by Date")
+        emit("4. Return to Main Menu")
+
+        choice = read_input("\nPlease select an option (1-4):\n")
+
+        if choice == "1":
+            view_progress()
+        elif choice == "2":
+            view_recent_progress()
+        elif choice == "3":
+            view_progress_by_date()
+        elif choice == "4":
+            emit("\nReturning to Main Menu...")
             break
         else:
             print_error("\nInvalid option. Please try again.")
@@ -872,15 +4616,143 @@ def flashcard_management_menu():
 def main():
     """
     Run program functions, main_menu will handle options and submenus.
+    Command-line arguments select a maintenance command instead.
     """
+    parser = argparse.ArgumentParser(description="Quiz Cards")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser(
+        "rebuild-summary",
+        help="regenerate the progress summary from the progress history",
+    )
+    analytics_parser = commands.add_parser(
+        "analytics",
+        help="show success rate percentiles, rolling averages and trends "
+        "overall and by category",
+    )
+    analytics_parser.add_argument(
+        "--window",
+        type=int,
+        default=ANALYTICS_WINDOW,
+        help="quizzes in each rolling average (default: %(default)s)",
+    )
+    history_parser = commands.add_parser(
+        "history",
+        help="print the quizzes taken in a period as JSON lines",
+    )
+    history_parser.add_argument(
+        "--days", type=int, help="only the last DAYS days"
+    )
+    history_parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="only quizzes on or after this date (YYYY-MM-DD)",
+    )
+    history_parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="only quizzes on or before this date (YYYY-MM-DD)",
+    )
+    history_parser.add_argument("--category", help="only this category")
+    commands.add_parser(
+        "dedupe",
+        help="remove Quiz Cards whose term repeats an earlier card's term",
+    )
+    import_parser = commands.add_parser(
+        "import", help="add Quiz Cards from a CSV or JSONL file"
+    )
+    import_parser.add_argument("path")
+    import_parser.add_argument(
+        "--format",
+        choices=("csv", "jsonl"),
+        help="file format (default: from the file extension)",
+    )
+    import_parser.add_argument(
+        "--allow-duplicates",
+        action="store_true",
+        help="also import cards whose term is already in the deck",
+    )
+    export_parser = commands.add_parser(
+        "export", help="write all Quiz Cards to a CSV or JSONL file"
+    )
+    export_parser.add_argument("path")
+    export_parser.add_argument(
+        "--format",
+        choices=("csv", "jsonl"),
+        help="file format (default: from the file extension)",
+    )
+    args = parser.parse_args()
+    if args.command in ("import", "export"):
+        args.path = os.path.abspath(args.path)  # As given, not in the user dir
+    enter_user_directory()
+    if args.command in ("rebuild-summary", "analytics", "history"):
+        initialize_progress_file()  # Migrates a legacy progress.json
+
+    if args.command == "rebuild-summary":
+        with storage_lock, file_lock(progress_file):
+            summary = rebuild_progress_summary()["overall"]
+        emit(
+            f"Progress summary rebuilt from {summary['num_quizzes']} "
+            "quizzes."
+        )
+        flush_screen()
+        return
+    if args.command == "analytics":
+        load_flashcards()  # To name the most missed cards
+        view_progress_analytics(max(args.window, 1))
+        flush_screen()
+        return
+    if args.command == "history":
+        screen_buffer().clear()  # Only JSON lines, not migration messages
+        start = args.since
+        if args.days is not None:
+            start = datetime.now() - timedelta(days=args.days)
+        end = None if args.until is None else args.until + timedelta(days=1)
+        for entry in read_progress_range(start, end, args.category):
+            emit(json.dumps(entry))
+        flush_screen()
+        return
+    if args.command == "dedupe":
+        load_flashcards()
+        with storage_transaction():
+            removed = remove_duplicate_flashcards()
+        emit(f"\nRemoved {removed} duplicate Quiz Cards.")
+        flush_screen()
+        return
+    if args.command == "import":
+        load_flashcards()
+        with storage_transaction():
+            imported, invalid, duplicates = import_flashcards(
+                args.path,
+                args.format or file_format(args.path),
+                skip_duplicates=not args.allow_duplicates,
+            )
+        emit(
+            f"\nImported {imported} Quiz Cards, skipping {invalid} invalid "
+            f"records and {duplicates} duplicates."
+        )
+        flush_screen()
+        return
+    if args.command == "export":
+        load_flashcards()
+        exported = export_flashcards(
+            args.path, args.format or file_format(args.path)
+        )
+        emit(f"\nExported {exported} Quiz Cards to {args.path}.")
+        flush_screen()
+        return
+
+    start_metrics()
+    handle_exit_signals()
     display_welcome_message()
     load_flashcards()
     initialize_progress_file()
     main_menu()
-    print("\nThank you for using Quiz Cards! Goodbye!")  # Exit message
+    emit("\nThank you for using Quiz Cards! Goodbye!")  # Exit message
+    flush_screen()
 
 
 # --- Run the Program ---
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,559 @@
+import argparse
+import asyncio
+import codecs
+import collections
+import fcntl
+import os
+import pty
+import queue
+import select
+import signal
+import socket
+import struct
+import sys
+import termios
+import threading
+import traceback
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import run
+
+# Files whose changes mean the preloaded deck is out of date
+DECK_FILES = (
+    "flashcards.json",
+    "flashcards.journal",
+    "flashcards.jsonl",
+    "quiz_cards.db",
+)
+TERMINAL_SIZE = (24, 80)  # Rows and columns, matching the node-pty default
+# Cards the users' decks cached in shared mode may hold in all before the
+# least recently used idle ones are evicted
+CACHE_CARDS = 1000000
+
+startup_output = ""  # Messages from loading the deck, replayed per session
+deck_signature = None
+run_code = None  # run.py compiled once for the users' copies of it
+deck_cache = None  # DeckCache of the users' decks in shared mode
+session_limit = None  # Sessions the shared server runs at once
+active_sessions = 0  # Sessions the shared server is running
+
+# --- Deck Preloading Functions ---
+
+
+def current_deck_signature():
+    """
+    Returns the size and modification time of every deck file, so a
+    changed deck can be detected without reading it.
+    """
+    signature = []
+    for filename in DECK_FILES:
+        try:
+            stat = os.stat(filename)
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+
+def preload_deck():
+    """
+    Loads the flashcards and progress file once, keeping the messages this
+    prints so each session can show them after its welcome message.
+    """
+    global startup_output, deck_signature
+    run.load_flashcards()
+    run.initialize_progress_file()
+    startup_output = "".join(run.screen_buffer())
+    run.screen_buffer().clear()
+    deck_signature = current_deck_signature()
+
+
+def refresh_deck():
+    """
+    Reloads the deck if another session has changed it since it was
+    preloaded. With per-user storage there is no shared deck; each
+    session loads its user's own.
+    """
+    if run.users_directory:
+        return
+    if current_deck_signature() != deck_signature:
+        if run.database is not None:
+            run.database.close()
+            run.database = None
+        preload_deck()
+
+
+# --- Per-User Deck Functions ---
+
+
+def load_user_deck(user):
+    """
+    Loads a user's deck into a fresh copy of the run module whose files
+    are in the user's directory, so each user has their own module-level
+    deck, indexes and locks. Metrics are recorded with the server's. The
+    messages from loading are dropped, since the deck outlives the session
+    that loaded it.
+    """
+    global run_code
+    if run_code is None:
+        with open(run.__file__) as file:
+            run_code = compile(file.read(), run.__file__, "exec")
+    directory = run.user_directory(user)
+    os.makedirs(directory, exist_ok=True)
+    deck = types.ModuleType("run")
+    deck.__file__ = run.__file__
+    deck.data_directory = directory
+    exec(run_code, deck.__dict__)
+    deck.metrics = run.metrics
+    deck.load_flashcards()
+    deck.initialize_progress_file()
+    deck.screen_buffer().clear()
+    return deck
+
+
+class DeckCache:
+    """
+    The users' decks loaded by the shared server, least recently used
+    first. Decks no session is using are evicted, oldest first, while the
+    decks together hold more than max_cards cards, so the busiest users
+    stay in memory without every user's deck being held at once.
+    """
+
+    def __init__(self, max_cards):
+        self.max_cards = max_cards
+        self.decks = collections.OrderedDict()  # User directory -> deck
+        self.sessions = collections.Counter()  # User directory -> sessions
+        self.loading = {}  # User directory -> lock held while it loads
+        self.lock = threading.Lock()
+
+    def open(self, user):
+        """
+        Returns the user's deck, loading it unless it is cached, and counts
+        one more session using it. Only sessions of the same user wait for
+        a deck to load. If loading fails the session is not counted.
+        """
+        key = run.user_directory(user)
+        with self.lock:
+            self.sessions[key] += 1
+            loading = self.loading.setdefault(key, threading.Lock())
+        try:
+            with loading:
+                with self.lock:
+                    deck = self.decks.get(key)
+                if deck is None:
+                    deck = load_user_deck(user)
+        except BaseException:
+            self.release(user)
+            raise
+        with self.lock:
+            self.decks[key] = deck
+            self.decks.move_to_end(key)
+            self.evict()
+        return deck
+
+    def release(self, user):
+        """
+        Counts one session fewer using the user's deck.
+        """
+        key = run.user_directory(user)
+        with self.lock:
+            self.sessions[key] -= 1
+            if not self.sessions[key]:
+                del self.sessions[key]
+                del self.loading[key]
+            self.evict()
+
+    def evict(self):
+        """
+        Drops idle decks, least recently used first, until the cached
+        decks fit in max_cards. Called with the lock held.
+        """
+        total = sum(len(deck.flashcards) for deck in self.decks.values())
+        for key in list(self.decks):
+            if total <= self.max_cards:
+                return
+            if key in self.sessions:
+                continue
+            deck = self.decks.pop(key)
+            total -= len(deck.flashcards)
+            deck.close_deck()  # Writes anything still waiting to be saved
+
+
+# --- Session Functions ---
+
+
+def run_session(deck=run):
+    """
+    Runs one Quiz Cards session on the current terminal, starting straight
+    from the preloaded deck. An unexpected error is logged and the user is
+    returned to the Main Menu rather than losing the session.
+    """
+    deck.display_welcome_message()
+    deck.emit(startup_output, end="")
+    while True:
+        try:
+            deck.main_menu()
+            break
+        except (EOFError, KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            traceback.print_exc()
+            deck.print_error(
+                "\nSomething went wrong. Returning to the Main Menu."
+            )
+    deck.emit("\nThank you for using Quiz Cards! Goodbye!")  # Exit message
+    deck.flush_screen()
+
+
+def relay(connection, master):
+    """
+    Copies data between the client connection and the session's terminal
+    until either side closes.
+    """
+    while True:
+        readable, _, _ = select.select([connection, master], [], [])
+        try:
+            if connection in readable:
+                data = connection.recv(4096)
+                if not data:
+                    return
+                os.write(master, data)
+            if master in readable:
+                data = os.read(master, 4096)
+                if not data:
+                    return
+                connection.sendall(data)
+        except OSError:  # Terminal closed when the session ended
+            return
+
+
+def serve_connection(connection, listener):
+    """
+    Gives a connection its own terminal and session. The session is forked
+    from this already initialised worker, so it starts in milliseconds.
+    """
+    pid, master = pty.fork()
+    if pid == 0:
+        listener.close()
+        connection.close()
+        run.database = None  # SQLite connections must not cross a fork
+        run.handle_exit_signals()  # The SIGHUP sent on disconnect flushes
+        status = 0
+        try:
+            if run.users_directory:
+                run.enter_user_directory()
+                preload_deck()  # The user's own deck
+            run_session()
+        except (EOFError, KeyboardInterrupt, SystemExit):
+            pass
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        run.flush_saves()  # os._exit skips atexit handlers
+        run.export_metrics(force=True)
+        os._exit(status)
+
+    fcntl.ioctl(
+        master, termios.TIOCSWINSZ, struct.pack("HHHH", *TERMINAL_SIZE, 0, 0)
+    )
+    try:
+        relay(connection, master)
+    finally:
+        connection.close()
+        try:
+            os.kill(pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+        os.waitpid(pid, 0)
+        os.close(master)
+
+
+# --- Worker Pool Functions ---
+
+
+def start_worker(listener, notify):
+    """
+    Forks a warm worker that waits for one connection, tells the pool it
+    has been taken, serves it and exits.
+    """
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        connection, _ = listener.accept()
+        os.write(notify, b".")  # Ask the pool for a replacement worker
+        refresh_deck()
+        serve_connection(connection, listener)
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    os._exit(status)
+
+
+def reap_workers(workers):
+    """
+    Collects exited workers and sessions without blocking.
+    """
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        workers.discard(pid)
+
+
+def serve(socket_path, pool_size):
+    """
+    Listens on a Unix socket and keeps pool_size idle workers, each with
+    the deck already loaded, ready to take the next connection.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+    if not run.users_directory:
+        preload_deck()
+
+    notify_read, notify_write = os.pipe()
+    workers = set()
+    idle = 0
+
+    def stop(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os.remove(socket_path)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Quiz Cards session pool listening on {socket_path}")
+    sys.stdout.flush()
+
+    while True:
+        while idle < pool_size:
+            refresh_deck()  # Replacement workers start from the newest deck
+            workers.add(start_worker(listener, notify_write))
+            idle += 1
+        readable, _, _ = select.select([notify_read], [], [], 1.0)
+        if readable:
+            idle -= len(os.read(notify_read, 1024))
+        reap_workers(workers)
+
+
+# --- Shared Process Functions ---
+
+
+class Session:
+    """
+    One connection served by the asyncio server. Acts as the input and
+    output stream of the thread running the session's menus: it echoes
+    typed characters and hands complete lines to the menu thread, and
+    sends the menu's output back over the connection.
+    """
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.lines = queue.Queue()
+        self.line = []  # Characters typed since the last Enter
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def feed(self, data):
+        """
+        Handles bytes from the client the way a terminal would.
+        """
+        for char in self.decoder.decode(data):
+            if char in "\r\n":
+                self.send("\r\n")
+                self.lines.put("".join(self.line) + "\n")
+                self.line = []
+            elif char in "\x7f\b":
+                if self.line:
+                    self.line.pop()
+                    self.send("\b \b")
+            elif char in "\x03\x04":  # Ctrl-C or Ctrl-D ends the session
+                self.close()
+            elif char.isprintable():
+                self.line.append(char)
+                self.send(char)
+
+    def close(self):
+        """
+        Ends input, so the menu thread's next read raises EOFError.
+        """
+        self.lines.put("")
+
+    def readline(self):
+        return self.lines.get()
+
+    def write(self, text):
+        self.loop.call_soon_threadsafe(self.send, text.replace("\n", "\r\n"))
+
+    def flush(self):
+        pass
+
+    def send(self, text):
+        if not self.writer.is_closing():
+            self.writer.write(text.encode())
+
+
+def run_shared_session(session):
+    """
+    Runs the menus for one session on a worker thread, with the session as
+    that thread's terminal. The deck itself is shared by every session, or
+    with per-user storage, by the sessions of the user it asks for.
+    """
+    run.terminal.input = session
+    run.terminal.output = session
+    try:
+        if run.users_directory:
+            run_user_session(session, run.ask_user())
+        else:
+            run_session()
+    except EOFError:
+        pass
+    except Exception:  # Only this session ends
+        traceback.print_exc()
+        run.print_error("\nSomething went wrong. Please try again later.")
+        run.flush_screen()
+    finally:
+        run.screen_buffer().clear()
+        run.terminal.input = run.terminal.output = None
+
+
+def run_user_session(session, user):
+    """
+    Runs a session on the user's deck from the deck cache.
+    """
+    deck = deck_cache.open(user)  # Not counted if it raises
+    deck.terminal.input = session
+    deck.terminal.output = session
+    try:
+        run_session(deck)
+    finally:
+        deck.screen_buffer().clear()
+        deck.terminal.input = deck.terminal.output = None
+        deck_cache.release(user)
+
+
+async def handle_shared_session(reader, writer):
+    """
+    Serves one connection until the user exits or disconnects. Once
+    session_limit sessions are running, further connections are told the
+    server is full and closed, rather than left waiting for a thread.
+    """
+    global active_sessions
+    if active_sessions >= session_limit:
+        writer.write(b"The server is full. Please try again later.\r\n")
+        writer.close()
+        return
+    active_sessions += 1
+    loop = asyncio.get_running_loop()
+    session = Session(loop, writer)
+    menus = loop.run_in_executor(None, run_shared_session, session)
+
+    async def read_input():
+        try:
+            while data := await reader.read(4096):
+                session.feed(data)
+        except ConnectionError:
+            pass
+        finally:  # Also on shutdown, so the menu thread can finish
+            session.close()
+
+    reading = asyncio.ensure_future(read_input())
+    try:
+        await menus
+    finally:
+        active_sessions -= 1
+        reading.cancel()
+        writer.close()
+
+
+async def serve_shared(socket_path, max_sessions, cache_cards):
+    """
+    Serves every session from this one process: the deck is loaded once
+    and shared, and each session costs a Session object and a thread.
+    With per-user storage, users' decks are loaded as their sessions start
+    and kept in a DeckCache of cache_cards cards.
+    """
+    global deck_cache, session_limit
+    session_limit = max_sessions
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    if run.users_directory:
+        deck_cache = DeckCache(cache_cards)
+    else:
+        preload_deck()
+    run.start_metrics()
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_sessions)
+    )
+    server = await asyncio.start_unix_server(
+        handle_shared_session, socket_path
+    )
+    print(f"Quiz Cards shared session server listening on {socket_path}")
+    sys.stdout.flush()
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """
+    Starts the session server from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve Quiz Cards sessions from pre-forked workers, "
+        "or from one shared asyncio process."
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("QUIZ_CARDS_SESSION_SOCKET", "quiz_cards.sock"),
+        help="Unix socket to listen on",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("fork", "shared"),
+        default=os.environ.get("QUIZ_CARDS_SESSION_MODE", "fork"),
+        help="pre-forked worker per session, or one process for all",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="idle workers to keep ready"
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=256,
+        help="concurrent sessions in shared mode",
+    )
+    parser.add_argument(
+        "--cache-cards",
+        type=int,
+        default=int(os.environ.get("QUIZ_CARDS_CACHE_CARDS", CACHE_CARDS)),
+        help="cards the users' decks cached in shared mode may hold",
+    )
+    args = parser.parse_args()
+    if args.mode == "shared":
+        run.handle_exit_signals()
+        try:
+            asyncio.run(
+                serve_shared(args.socket, args.max_sessions, args.cache_cards)
+            )
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve(args.socket, args.workers)
+
+
+if __name__ == "__main__":
+    main()